@@ -0,0 +1,131 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+# Serials are spread over 13 digits by an affine permutation (the multiplier
+# is coprime with 10, so every serial maps to a distinct number) and a Luhn
+# check digit is appended, account numbers are 14 digits long.
+SERIAL_DIGITS = 13
+SERIAL_SPACE = 10 ** SERIAL_DIGITS
+MULTIPLIER = 7919787203311
+OFFSET = 1234567890123
+
+# Account numbers issued before the allocator, 13 symbols out of this set.
+LEGACY_LENGTH = 13
+LEGACY_SYMBOLS = set('0123456789ABCDEFGH')
+
+SEQUENCE_NAME = 'administrations_account_number_block_seq'
+
+
+def luhn_check_digit(digits):
+    total = 0
+    for index, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if index % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_account_number(value):
+    """Cheap format check, done before an account number reaches the database."""
+    if len(value) == LEGACY_LENGTH:
+        return set(value) <= LEGACY_SYMBOLS
+    return (
+        len(value) == SERIAL_DIGITS + 1
+        and value.isdigit()
+        and luhn_check_digit(value[:-1]) == value[-1]
+    )
+
+
+def format_account_number(serial):
+    permuted = (serial * MULTIPLIER + OFFSET) % SERIAL_SPACE
+    digits = str(permuted).zfill(SERIAL_DIGITS)
+    return digits + luhn_check_digit(digits)
+
+
+def claim_block():
+    """Take the next block number off the AccountNumberSequence row."""
+    from .models import AccountNumberSequence
+
+    with transaction.atomic():
+        sequence, _ = AccountNumberSequence.objects.select_for_update().get_or_create(
+            pk=1,
+        )
+        block = sequence.next_block
+        sequence.next_block += 1
+        sequence.save(update_fields=['next_block', 'modified'])
+    return block
+
+
+def claim_block_committed():
+    # Runs on a thread of its own, hence on a connection of its own.
+    try:
+        return claim_block()
+    finally:
+        connection.close()
+
+
+def allocate_block(block_size):
+    """
+    Reserve `block_size` serials, returns the first one. A reserved block is
+    never handed out again, even when the signup that claimed it fails.
+    """
+    if connection.vendor == 'postgresql':
+        # nextval() is never rolled back.
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [SEQUENCE_NAME])
+            block = cursor.fetchone()[0]
+        return block * block_size
+
+    if connection.in_atomic_block and connection.vendor != 'sqlite':
+        # Committed on another connection, a rollback of the caller's
+        # transaction cannot release the block.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(claim_block_committed).result() * block_size
+
+    # SQLite has a single writer, a second connection would wait for the
+    # caller's transaction forever. A block claimed inside a transaction
+    # that rolls back can be claimed again by another process, the unique
+    # account_number then rejects the second account rather than issuing
+    # its number twice.
+    return claim_block() * block_size
+
+
+class AccountNumberAllocator:
+    """
+    Hands out account numbers from a block of serials reserved for the
+    current process, so signups only touch the shared sequence once per
+    block.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.next_serial = 0
+        self.end = 0
+
+    def allocate(self):
+        with self.lock:
+            # Never share a block with the process it was forked from.
+            if self.pid != os.getpid() or self.next_serial >= self.end:
+                if self.pid != os.getpid():
+                    self.end = 0
+                block_size = settings.ACCOUNT_NUMBER_BLOCK_SIZE
+                # On SQLite a rolled back signup can release its block, at
+                # least never go back within this process.
+                self.next_serial = max(allocate_block(block_size), self.end)
+                self.end = self.next_serial + block_size
+                self.pid = os.getpid()
+
+            serial = self.next_serial
+            self.next_serial += 1
+        return format_account_number(serial)
+
+
+allocator = AccountNumberAllocator()
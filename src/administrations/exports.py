@@ -0,0 +1,72 @@
+import csv
+import json
+
+from django.db.models import Q
+
+from cores.asynchronous import run_off_event_loop
+
+# Rows are sent in groups of this size, small enough for the first bytes to
+# leave early, large enough to avoid a write per row.
+LINES_PER_CHUNK = 100
+
+
+class Echo:
+    """File-like object handing back what `csv.writer` writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def keyset_rows(rows, chunk_size):
+    """
+    The `.values()` rows of a queryset ordered by `created` and `id`, fetched
+    `chunk_size` at a time. Every chunk is a query of its own starting after
+    the last row, so none of them depends on the connection of the others
+    and each runs off the event loop under ASGI.
+    """
+    last = None
+    while True:
+        chunk = rows
+        if last is not None:
+            chunk = chunk.filter(
+                Q(created__gt=last['created']) | Q(created=last['created'], id__gt=last['id']),
+            )
+        fetched = run_off_event_loop(list, chunk[:chunk_size])
+        yield from fetched
+        if len(fetched) < chunk_size:
+            return
+        last = fetched[-1]
+
+
+def group_lines(lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= LINES_PER_CHUNK:
+            yield ''.join(chunk).encode()
+            chunk = []
+    if chunk:
+        yield ''.join(chunk).encode()
+
+
+def csv_lines(records, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for record in records:
+        yield writer.writerow([record[field] for field in fields])
+
+
+def ndjson_lines(records, fields):
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', csv_lines),
+    'ndjson': ('application/x-ndjson', ndjson_lines),
+}
+
+
+def export_lines(records, fields, file_format):
+    _, lines = EXPORT_FORMATS[file_format]
+    return group_lines(lines(records, fields))
@@ -0,0 +1,188 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+
+from cores.cache import ACCOUNT_SUMMARY, invalidate_summaries
+from .models import BankInformation, BankStatement
+from .services import lock_accounts
+
+logger = logging.getLogger(__name__)
+
+
+class InactiveAccount(Exception):
+    pass
+
+
+class GroupCommitTimeout(Exception):
+    pass
+
+
+class GroupCommitWriter:
+    """
+    Collects deposits submitted by concurrent requests of a worker process
+    and writes them from a single background thread, one transaction and one
+    multi-row insert per batch, so many requests share a single commit.
+    """
+
+    def __init__(self, window_ms, max_batch_size, timeout=5):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def submit(self, statement):
+        """
+        Queue an unsaved BankStatement of an active account and wait until it
+        is committed. Raises InactiveAccount when the account is not active,
+        GroupCommitTimeout when it is not written within `timeout` seconds.
+        """
+        self.ensure_started()
+        future = Future()
+        self.queue.put((statement, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Still queued, it will never be written.
+            if future.cancel():
+                raise GroupCommitTimeout('Timed out waiting for the group commit.')
+        # Already being written, its transaction decides.
+        return future.result()
+
+    def ensure_started(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                # A forked worker inherits the object but not the thread.
+                self.queue = queue.Queue()
+                self.pid = os.getpid()
+                self.thread = None
+            if self.thread is None or not self.thread.is_alive():
+                if self.thread is not None:
+                    logger.error('Group commit writer thread died, restarting it.')
+                self.thread = threading.Thread(
+                    target=self.run,
+                    name='group-commit-writer',
+                    daemon=True,
+                )
+                self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Entries given up by their request are dropped.
+            batch = [
+                (statement, future) for statement, future in batch
+                if future.set_running_or_notify_cancel()
+            ]
+            try:
+                if batch:
+                    self.flush(batch)
+            except Exception as exc:
+                logger.exception('Group commit of %s deposit(s) failed.', len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+            finally:
+                try:
+                    connection.close_if_unusable_or_obsolete()
+                except Exception:
+                    logger.exception('Closing the group commit connection failed.')
+
+    def flush(self, batch):
+        statements = [statement for statement, _ in batch]
+        try:
+            with transaction.atomic():
+                write_statements(statements, require_active=True)
+        except Exception:
+            # Isolate the failing entry, the others still get their commit.
+            for statement, future in batch:
+                statement.pk = None
+                statement._state.adding = True
+                try:
+                    with transaction.atomic():
+                        write_statements([statement], require_active=True)
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(statement)
+            return
+
+        for statement, future in batch:
+            future.set_result(statement)
+
+
+def write_statements(statements, require_active=False, accounts=None):
+    """
+    Lock the accounts in pk order, apply the net effect of the statements on
+    every account with a single UPDATE and insert them. Callers that already
+    hold the locks pass the `accounts` of `lock_accounts`. With
+    `require_active` InactiveAccount is raised when an account is not active.
+    Must be called inside `transaction.atomic`.
+    """
+    deltas = {}
+    for statement in statements:
+        delta = -statement.amount if statement.is_debit else statement.amount
+        deltas[statement.bank_info_id] = deltas.get(statement.bank_info_id, 0) + delta
+
+    # Same pk order as every other writer, the UPDATE alone locks rows in
+    # whatever order the database visits them.
+    if accounts is None:
+        accounts = lock_accounts(Q(pk__in=deltas))
+    if require_active and not all(
+        pk in accounts and accounts[pk].is_active for pk in deltas
+    ):
+        raise InactiveAccount('Bank account is blocked or inactive.')
+
+    BankInformation.all_objects.filter(pk__in=deltas).update(
+        balance=F('balance') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        ),
+    )
+
+    if connection.features.can_return_rows_from_bulk_insert:
+        BankStatement.objects.bulk_create(statements)
+    else:
+        # Each caller needs its statement id back.
+        for statement in statements:
+            statement.save()
+
+    invalidate_summaries(
+        ACCOUNT_SUMMARY,
+        [statement.bank_info.holder_id for statement in statements],
+    )
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = GroupCommitWriter(
+                window_ms=settings.GROUP_COMMIT['WINDOW_MS'],
+                max_batch_size=settings.GROUP_COMMIT['MAX_BATCH_SIZE'],
+                timeout=settings.GROUP_COMMIT['TIMEOUT_SECONDS'],
+            )
+    return _writer
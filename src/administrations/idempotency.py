@@ -0,0 +1,84 @@
+import functools
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+def request_hash(request):
+    payload = json.dumps(
+        [request.method, request.path, request.data],
+        sort_keys=True,
+        cls=DjangoJSONEncoder,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def replay(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return Response(
+            {'idempotency_key': 'Key was already used for a different request.'},
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(
+        record.response,
+        record.status_code,
+        headers={'Idempotent-Replayed': 'true'},
+    )
+
+
+def idempotent(create):
+    """
+    Make a create action honour the `Idempotency-Key` header.
+
+    The key row is inserted before the action runs and committed together
+    with its response, so a concurrent duplicate blocks on the unique index
+    until the first execution finishes and then replays its response.
+    Unsuccessful responses are rolled back with the key so they can be
+    retried.
+    """
+    @functools.wraps(create)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return create(self, request, *args, **kwargs)
+
+        customer_pk = request.user.customer.pk
+        fingerprint = request_hash(request)
+        record = IdempotencyKey.objects.filter(
+            customer_id=customer_pk,
+            key=key,
+        ).first()
+        if record is not None:
+            return replay(record, fingerprint)
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        customer_id=customer_pk,
+                        key=key,
+                        request_hash=fingerprint,
+                    )
+            except IntegrityError:
+                record = IdempotencyKey.objects.get(customer_id=customer_pk, key=key)
+                return replay(record, fingerprint)
+
+            response = create(self, request, *args, **kwargs)
+            if not status.is_success(response.status_code):
+                transaction.set_rollback(True)
+                return response
+
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=['status_code', 'response', 'modified'])
+
+        return response
+    return wrapper
@@ -0,0 +1,65 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from administrations import group_commit as writer_module
+from administrations.management.utils import (create_throwaway_customers,
+                                              delete_throwaway_customers)
+from administrations.serializers import DepositTransactionSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare deposit throughput of single commits and group commits.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=32)
+        parser.add_argument('--deposits', type=int, default=5000)
+        parser.add_argument('--window-ms', type=int, default=5)
+        parser.add_argument('--max-batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        customers = create_throwaway_customers(prefix, options['accounts'], 0)
+        try:
+            for enabled in [False, True]:
+                group_commit = dict(
+                    settings.GROUP_COMMIT,
+                    ENABLED=enabled,
+                    WINDOW_MS=options['window_ms'],
+                    MAX_BATCH_SIZE=options['max_batch_size'],
+                )
+                # The writer is built from the settings on first use.
+                writer_module._writer = None
+                with override_settings(GROUP_COMMIT=group_commit):
+                    elapsed = self.run(customers, options['deposits'], options['workers'])
+                writer_module._writer = None
+
+                mode = 'group commit' if enabled else 'single commit'
+                self.stdout.write(f'{mode}: {options["deposits"]} deposits in {elapsed:.2f}s '
+                                  f'({options["deposits"] / elapsed:.1f} deposits/s)')
+        finally:
+            delete_throwaway_customers(prefix)
+
+    def run(self, customers, deposits, workers):
+        def deposit(index):
+            try:
+                serializer = DepositTransactionSerializer(data={
+                    'sender': customers[index % len(customers)].pk,
+                    'amount': Decimal('10'),
+                })
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(deposit, range(deposits)))
+        return time.perf_counter() - started
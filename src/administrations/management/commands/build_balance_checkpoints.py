@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from administrations.models import BankInformation
+from administrations.services import build_balance_checkpoints
+
+
+class Command(BaseCommand):
+    help = 'Append daily closing balance checkpoints for every closed day.'
+
+    def handle(self, *args, **options):
+        created = 0
+        for bank_info in BankInformation.all_objects.order_by('pk').iterator():
+            created += build_balance_checkpoints(bank_info)
+
+        self.stdout.write(self.style.SUCCESS(f'{created} checkpoint(s) created.'))
@@ -0,0 +1,44 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from administrations.services import build_monthly_summaries, stale_summary_accounts
+
+
+def build_accounts(account_pks):
+    return sum(build_monthly_summaries(pk) for pk in account_pks)
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the monthly statement summaries from the first month not '
+            'matching its statements, accounts are spread over a pool of processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes, 1 builds in the current process.')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Accounts handed to a process at once.')
+
+    def handle(self, *args, **options):
+        account_pks = list(stale_summary_accounts())
+        batch_size = options['batch_size']
+        batches = [
+            account_pks[index:index + batch_size]
+            for index in range(0, len(account_pks), batch_size)
+        ]
+
+        if options['workers'] == 1:
+            months = sum(build_accounts(batch) for batch in batches)
+        else:
+            # Forked workers must not share the connections of this process.
+            connections.close_all()
+            months = 0
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+                for future in as_completed([pool.submit(build_accounts, batch) for batch in batches]):
+                    months += future.result()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{months} month(s) of {len(account_pks)} account(s) rebuilt.'
+        ))
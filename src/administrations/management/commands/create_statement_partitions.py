@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from administrations.partitioning import (add_months, ensure_partitions, is_partitioned,
+                                          is_supported, rebuild_table)
+
+
+class Command(BaseCommand):
+    help = 'Create the monthly partitions of the statements table ahead of time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=None)
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Partition the statements table first if it is still a plain '
+                 'table, locks it while the rows are copied.',
+        )
+
+    def handle(self, *args, **options):
+        if not is_supported(connection):
+            self.stdout.write('Partitioning needs PostgreSQL 11 or later, nothing to do.')
+            return
+
+        months_ahead = options['months_ahead']
+        if months_ahead is None:
+            months_ahead = settings.STATEMENT_PARTITIONS_AHEAD
+
+        with transaction.atomic():
+            if not is_partitioned(connection):
+                if not options['convert']:
+                    raise CommandError('The statements table is not partitioned, '
+                                       'run with --convert to partition it.')
+                rebuild_table(connection, partitioned=True)
+                self.stdout.write('Statements table partitioned.')
+
+            this_month = timezone.localdate().replace(day=1)
+            created = ensure_partitions(connection, this_month, add_months(this_month, months_ahead))
+
+        for name in created:
+            self.stdout.write(f'{name} created.')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partition(s) created.'))
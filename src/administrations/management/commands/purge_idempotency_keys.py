@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from administrations.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL.'
+
+    def handle(self, *args, **options):
+        expired_before = timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+        deleted, _ = IdempotencyKey.objects.filter(created__lt=expired_before).delete()
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted} expired key(s) purged.'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from administrations.models import BankInformation, ledger_sum
+from cores.cache import ACCOUNT_SUMMARY, invalidate_summaries
+
+
+class Command(BaseCommand):
+    help = 'Compare stored account balances against the ledger and repair drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted accounts, do not repair them.',
+        )
+
+    def handle(self, *args, **options):
+        drifted = BankInformation.all_objects.annotate(
+            ledger=ledger_sum('mutations__'),
+        ).exclude(balance=F('ledger')).values_list('pk', flat=True)
+
+        repaired = 0
+        for pk in list(drifted):
+            with transaction.atomic():
+                # Recompute under the row lock so postings in flight are
+                # either fully included or not included at all.
+                bank_info = BankInformation.all_objects.select_for_update().get(pk=pk)
+                ledger = bank_info.ledger_balance()
+                if bank_info.balance == ledger:
+                    continue
+
+                self.stdout.write(
+                    f'{bank_info.account_number}: stored {bank_info.balance}, '
+                    f'ledger {ledger}'
+                )
+                if options['dry_run']:
+                    continue
+
+                bank_info.balance = ledger
+                bank_info.save(update_fields=['balance', 'modified'])
+                invalidate_summaries(ACCOUNT_SUMMARY, [bank_info.holder_id])
+                repaired += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{repaired} account(s) repaired.'))
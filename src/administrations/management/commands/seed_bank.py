@@ -0,0 +1,87 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from administrations.seeding import plan_chunks, seed_chunk
+from administrations.services import start_of_day
+
+
+class Command(BaseCommand):
+    help = ('Generate customers, accounts and consistent ledgers from a '
+            'deterministic seed, a few hot accounts hold most statements and '
+            'a dormant tail none. Chunks of customers are spread over a pool '
+            'of processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=10000)
+        parser.add_argument('--statements', type=int, default=1000000,
+                            help='Statements in total, about.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent of the account activity, 0 is uniform.')
+        parser.add_argument('--dormant', type=float, default=0.3,
+                            help='Fraction of accounts without any statement.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Statements are spread over the days before --end.')
+        parser.add_argument('--end', default=None,
+                            help='Last day (excluded) as YYYY-MM-DD, today by default.')
+        parser.add_argument('--prefix', default='seed',
+                            help='Usernames are <prefix>-<n>@example.com.')
+        parser.add_argument('--password', default='seeded123',
+                            help='Password of every generated user.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes, 1 writes in the current process.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Customers written by a process at once.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['dormant'] < 1:
+            raise CommandError('--dormant must be at least 0 and below 1.')
+        if User.objects.filter(username__startswith=f'{options["prefix"]}-').exists():
+            raise CommandError(f'Users prefixed with "{options["prefix"]}-" already exist, pick another --prefix.')
+
+        end = timezone.localdate()
+        if options['end']:
+            end = parse_date(options['end'])
+            if end is None:
+                raise CommandError('--end must be a date as YYYY-MM-DD.')
+
+        shared = {
+            'prefix': options['prefix'],
+            'seed': options['seed'],
+            'start': start_of_day(end - timedelta(days=options['days'])),
+            'end': start_of_day(end),
+            # Hashed once, every user gets the same hash.
+            'password': make_password(options['password']),
+            'batch_size': options['batch_size'],
+        }
+        chunks = plan_chunks(
+            options['customers'], options['statements'], options['chunk_size'],
+            options['skew'], options['dormant'], options['seed'],
+        )
+
+        started = time.monotonic()
+        if options['workers'] == 1:
+            statements = sum(seed_chunk(**shared, **chunk) for chunk in chunks)
+        else:
+            # Forked workers must not share the connections of this process.
+            connections.close_all()
+            statements = 0
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+                futures = [pool.submit(seed_chunk, **shared, **chunk) for chunk in chunks]
+                for future in as_completed(futures):
+                    statements += future.result()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["customers"]} customer(s) and {statements} statement(s) seeded '
+            f'in {time.monotonic() - started:.1f}s.'
+        ))
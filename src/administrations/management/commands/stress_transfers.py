@@ -0,0 +1,126 @@
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from rest_framework import serializers
+
+from administrations.management.utils import (create_throwaway_customers,
+                                              delete_throwaway_customers)
+from administrations.models import BankInformation
+from administrations.serializers import TransferTransactionSerializer, WithdrawSerializer
+
+DEADLOCK_DETECTED = '40P01'
+
+
+class Command(BaseCommand):
+    help = ('Fire concurrent criss-cross transfers and withdrawals against a '
+            'set of throwaway accounts and check that no money was lost.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=10)
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=2000)
+        parser.add_argument('--initial-balance', type=Decimal, default=Decimal('100000'))
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the generated customers instead of deleting them.',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = f'stress-{uuid.uuid4().hex[:8]}'
+        customers = create_throwaway_customers(
+            prefix, options['accounts'], options['initial_balance'],
+        )
+        account_pks = [customer.bankinformation.pk for customer in customers]
+        balance_before = self.total_balance(account_pks)
+
+        # Criss-cross pairs, every transfer a -> b is matched with b -> a.
+        operations = []
+        for _ in range(options['operations'] // 2):
+            a, b = rng.sample(customers, 2)
+            amount = Decimal(rng.randint(1, 500))
+            if rng.random() < 0.2:
+                operations.append(('withdraw', a, None, amount))
+                operations.append(('withdraw', b, None, amount))
+            else:
+                operations.append(('transfer', a, b, amount))
+                operations.append(('transfer', b, a, amount))
+
+        outcomes = Counter()
+        withdrawn = []
+        lock = threading.Lock()
+
+        def run_operation(operation):
+            kind, sender, receiver, amount = operation
+            try:
+                if kind == 'transfer':
+                    serializer = TransferTransactionSerializer(data={
+                        'sender': sender.pk,
+                        'destination_account_number': receiver.bankinformation.account_number,
+                        'amount': amount,
+                    })
+                else:
+                    serializer = WithdrawSerializer(data={
+                        'sender': sender.pk,
+                        'amount': amount,
+                    })
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                outcome = 'committed'
+            except serializers.ValidationError:
+                outcome = 'rejected'
+            except OperationalError as exc:
+                pgcode = getattr(exc.__cause__, 'pgcode', None)
+                outcome = 'deadlocks' if pgcode == DEADLOCK_DETECTED else 'errors'
+            finally:
+                connection.close()
+
+            with lock:
+                outcomes[outcome] += 1
+                if kind == 'withdraw' and outcome == 'committed':
+                    withdrawn.append(amount)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            list(executor.map(run_operation, operations))
+        elapsed = time.perf_counter() - started
+
+        balance_after = self.total_balance(account_pks)
+        expected = balance_before - sum(withdrawn)
+        drifted = [
+            account.account_number
+            for account in BankInformation.objects.filter(pk__in=account_pks)
+            if account.balance != account.ledger_balance()
+        ]
+
+        self.stdout.write(f'operations: {len(operations)} in {elapsed:.2f}s '
+                          f'({len(operations) / elapsed:.1f} ops/s)')
+        for outcome in ['committed', 'rejected', 'deadlocks', 'errors']:
+            self.stdout.write(f'{outcome}: {outcomes[outcome]}')
+        self.stdout.write(f'balance before: {balance_before}, after: {balance_after}, '
+                          f'expected: {expected}')
+
+        if not options['keep']:
+            delete_throwaway_customers(prefix)
+
+        if balance_after != expected or drifted:
+            self.stderr.write(self.style.ERROR(
+                f'Balances not preserved, drifted accounts: {drifted}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Balances preserved.'))
+
+    def total_balance(self, account_pks):
+        return BankInformation.objects.filter(
+            pk__in=account_pks,
+        ).aggregate(total=Sum('balance'))['total']
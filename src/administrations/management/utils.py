@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from administrations.models import BankInformation
+from administrations.services import post_statement
+from customers.models import Customer
+
+
+@transaction.atomic
+def create_throwaway_customers(prefix, count, initial_balance):
+    """Active customers for benchmarks, remove them with `delete_throwaway_customers`."""
+    customers = []
+    for index in range(count):
+        email = f'{prefix}-{index}@example.com'
+        user = User.objects.create_user(username=email, email=email)
+        customer = Customer.objects.create(
+            identity_number=f'{prefix}-{index}',
+            address='Benchmark',
+            sex=Customer.MALE,
+            user=user,
+        )
+        bank_info = BankInformation.objects.create(
+            account_number=BankInformation.generate_account_number(),
+            holder=customer,
+            is_active=True,
+        )
+        if initial_balance:
+            post_statement(
+                bank_info=bank_info,
+                sender=customer,
+                receiver=customer,
+                amount=initial_balance,
+                is_debit=False,
+                description='Amount deposit',
+            )
+        customers.append(customer)
+    return customers
+
+
+def delete_throwaway_customers(prefix):
+    User.objects.filter(username__startswith=f'{prefix}-').delete()
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:26
+
+from django.db import migrations, models
+from django.db.models import Case, F, Sum, When
+
+
+def backfill_balance(apps, schema_editor):
+    BankInformation = apps.get_model('administrations', 'BankInformation')
+    BankStatement = apps.get_model('administrations', 'BankStatement')
+
+    totals = BankStatement.objects.values('bank_info').annotate(
+        total=Sum(Case(
+            When(is_debit=True, then=F('amount') * -1),
+            default=F('amount'),
+        )),
+    )
+    for row in totals.iterator():
+        BankInformation.objects.filter(pk=row['bank_info']).update(
+            balance=row['total'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrations', '0002_bankstatement_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankinformation',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+        migrations.RunPython(backfill_balance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrations', '0003_bankinformation_balance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('date', models.DateField()),
+                ('closing_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('bank_info', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='administrations.bankinformation')),
+            ],
+            options={
+                'unique_together': {('bank_info', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrations', '0004_balancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bankstatement',
+            index=models.Index(fields=['bank_info', 'is_deleted', 'created', 'id'], name='statement_mutations_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrations', '0007_accountnumbersequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyStatementSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('month', models.DateField()),
+                ('opening_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('closing_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('total_credit', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('total_debit', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('transaction_count', models.PositiveIntegerField()),
+                ('last_statement_id', models.BigIntegerField()),
+                ('bank_info', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to='administrations.bankinformation')),
+            ],
+            options={
+                'unique_together': {('bank_info', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db import migrations
+
+from administrations.partitioning import is_partitioned, is_supported, rebuild_table
+
+
+def partition_statements(apps, schema_editor):
+    connection = schema_editor.connection
+    if settings.PARTITION_STATEMENTS and is_supported(connection) and not is_partitioned(connection):
+        rebuild_table(connection, partitioned=True)
+
+
+def unpartition_statements(apps, schema_editor):
+    connection = schema_editor.connection
+    if is_partitioned(connection):
+        rebuild_table(connection, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrations', '0008_monthlystatementsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_statements, unpartition_statements),
+    ]
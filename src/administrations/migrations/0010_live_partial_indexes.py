@@ -0,0 +1,26 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administrations', '0009_partition_bankstatement'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bankinformation',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['account_number'], name='bankinfo_live_account_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankstatement',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['bank_info', 'created', 'id'], name='statement_live_mutations_idx'),
+        ),
+        # Dropped once its replacement exists.
+        migrations.RemoveIndex(
+            model_name='bankstatement',
+            name='statement_mutations_idx',
+        ),
+    ]
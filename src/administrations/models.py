@@ -1,10 +1,26 @@
-import random
 import uuid
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 
 from cores.models import CommonInfo
+from .account_numbers import allocator
+
+
+def ledger_sum(prefix=''):
+    # Credits minus debits, `prefix` allows summing across a relation
+    # e.g. `ledger_sum('mutations__')` when annotating BankInformation.
+    signed_amount = Case(
+        When(**{f'{prefix}is_debit': True}, then=F(f'{prefix}amount') * -1),
+        default=F(f'{prefix}amount'),
+    )
+    return Coalesce(
+        Sum(signed_amount),
+        Value(0),
+        output_field=DecimalField(max_digits=15, decimal_places=2),
+    )
 
 
 class BankInformation(CommonInfo):
@@ -12,35 +28,31 @@ class BankInformation(CommonInfo):
     account_number = models.CharField(max_length=15, unique=True)
     holder = models.OneToOneField('customers.Customer', on_delete=models.CASCADE)
     is_active = models.BooleanField(default=False)
+    balance = models.DecimalField(max_digits=15, decimal_places=2, default=0)
 
     @property
     def total_balance(self):
-        aggregate_credit = BankStatement.objects.filter(
-            bank_info__pk=self.pk,
-            is_debit=False,
-        ).aggregate(total=Sum('amount'))
+        return self.balance
 
-        aggregate_debit = BankStatement.objects.filter(
-            bank_info__pk=self.pk,
-            is_debit=True,
-        ).aggregate(total=Sum('amount'))
-
-        credit = aggregate_credit.get('total')
-        credit = credit if credit is not None else 0
-
-        debit = aggregate_debit.get('total')
-        debit = debit if debit is not None else 0
-
-        return credit - debit
+    def ledger_balance(self):
+        # The ledger includes soft deleted statements, as the stored balance.
+        aggregate = BankStatement.all_objects.filter(bank_info=self).aggregate(total=ledger_sum())
+        return aggregate.get('total')
 
     @classmethod
     def generate_account_number(cls):
-        return ''.join(random.choice('0123456789ABCDEFGH') for _ in range(13))
+        return allocator.allocate()
 
     def __str__(self):
         return self.account_number
 
 
+class AccountNumberSequence(CommonInfo):
+    # Block counter of the account number allocator on databases without
+    # sequences, PostgreSQL uses a real (non-transactional) sequence instead.
+    next_block = models.BigIntegerField(default=0)
+
+
 class BankStatement(CommonInfo):
     bank_info = models.ForeignKey(  # Bank information for the receiver.
         BankInformation,
@@ -61,8 +73,76 @@ class BankStatement(CommonInfo):
     is_debit = models.BooleanField(default=False)
     description = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['bank_info', 'created', 'id'],
+                condition=Q(is_deleted=False),
+                name='statement_live_mutations_idx',
+            ),
+        ]
+
     def __str__(self):
         return (f'Owner: {self.bank_info.holder.user.get_full_name()} '
                 f'{"Debit: " if self.is_debit else "Credit: "} {self.amount}')
 
 
+class BalanceCheckpoint(CommonInfo):
+    bank_info = models.ForeignKey(
+        BankInformation,
+        related_name='checkpoints',
+        on_delete=models.CASCADE,
+    )
+    date = models.DateField()
+    closing_balance = models.DecimalField(max_digits=15, decimal_places=2)
+
+    class Meta:
+        unique_together = ['bank_info', 'date']
+
+    def __str__(self):
+        return f'{self.bank_info.account_number} {self.date}: {self.closing_balance}'
+
+
+class MonthlyStatementSummary(CommonInfo):
+    bank_info = models.ForeignKey(
+        BankInformation,
+        related_name='monthly_summaries',
+        on_delete=models.CASCADE,
+    )
+    month = models.DateField()  # First day of the month.
+    opening_balance = models.DecimalField(max_digits=15, decimal_places=2)
+    closing_balance = models.DecimalField(max_digits=15, decimal_places=2)
+    total_credit = models.DecimalField(max_digits=15, decimal_places=2)
+    total_debit = models.DecimalField(max_digits=15, decimal_places=2)
+    transaction_count = models.PositiveIntegerField()
+    # Highest statement included.
+    last_statement_id = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ['bank_info', 'month']
+
+    def __str__(self):
+        return f'{self.bank_info.account_number} {self.month:%Y-%m}: {self.closing_balance}'
+
+
+class IdempotencyKey(CommonInfo):
+    customer = models.ForeignKey(
+        'customers.Customer',
+        related_name='idempotency_keys',
+        on_delete=models.CASCADE,
+    )
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['customer', 'key'],
+                name='unique_customer_idempotency_key',
+            ),
+        ]
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class MutationCursorPagination(CursorPagination):
+    # `id` breaks ties between statements posted in the same instant, pages
+    # are then index range scans over the live rows index (bank_info, created, id).
+    ordering = ('-created', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 500
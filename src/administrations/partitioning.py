@@ -0,0 +1,148 @@
+"""
+Range partitioning of the statements table by `created` month, PostgreSQL 11
+and later only, every other database keeps the plain table.
+
+The primary key of a partitioned table must include the partition key, it
+becomes (id, created). Nothing references statements by foreign key, ids
+stay unique through the shared sequence.
+"""
+from datetime import date
+
+TABLE = 'administrations_bankstatement'
+UNPARTITIONED = f'{TABLE}_unpartitioned'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def is_supported(connection):
+    return connection.vendor == 'postgresql' and connection.pg_version >= 110000
+
+
+def is_partitioned(connection):
+    if not is_supported(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass',
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_{month:%Y%m}'
+
+
+def rebuild_table(connection, partitioned):
+    """
+    Copy the statements into a new partitioned (or plain) table under the
+    same name, keeping the names of its indexes and constraints so later
+    migrations still find them. Locks the table, run it inside a transaction.
+    """
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+            [TABLE, f'{TABLE}_pkey'],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [TABLE, 'id'])
+        sequence = cursor.fetchone()[0]
+        cursor.execute('SELECT min(created), max(created) FROM %s' % quote(TABLE))
+        first, last = cursor.fetchone()
+
+        cursor.execute('ALTER TABLE %s RENAME TO %s' % (quote(TABLE), quote(UNPARTITIONED)))
+        cursor.execute(
+            'CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS)%s' % (
+                quote(TABLE),
+                quote(UNPARTITIONED),
+                ' PARTITION BY RANGE (created)' if partitioned else '',
+            )
+        )
+        if partitioned:
+            cursor.execute('CREATE TABLE %s PARTITION OF %s DEFAULT' % (
+                quote(DEFAULT_PARTITION), quote(TABLE),
+            ))
+        if partitioned and first is not None:
+            ensure_partitions(connection, first.date(), last.date())
+
+        cursor.execute('INSERT INTO %s SELECT * FROM %s' % (quote(TABLE), quote(UNPARTITIONED)))
+        cursor.execute('ALTER SEQUENCE %s OWNED BY %s.id' % (sequence, quote(TABLE)))
+        cursor.execute('DROP TABLE %s' % quote(UNPARTITIONED))
+
+        primary_key = '(id, created)' if partitioned else '(id)'
+        cursor.execute('ALTER TABLE %s ADD CONSTRAINT %s PRIMARY KEY %s' % (
+            quote(TABLE), quote(f'{TABLE}_pkey'), primary_key,
+        ))
+        for index in indexes:
+            cursor.execute(index)
+        for name, definition in foreign_keys:
+            cursor.execute('ALTER TABLE %s ADD CONSTRAINT %s %s' % (
+                quote(TABLE), quote(name), definition,
+            ))
+
+
+def create_partition(connection, month):
+    """
+    Create the partition of `month`, moving its rows out of the default
+    partition if some landed there. Returns False if it already exists.
+    """
+    quote = connection.ops.quote_name
+    name = partition_name(month)
+    bounds = [month, add_months(month, 1)]
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute(
+            'SELECT 1 FROM %s WHERE created >= %%s AND created < %%s LIMIT 1'
+            % quote(DEFAULT_PARTITION),
+            bounds,
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(
+                'CREATE TABLE %s PARTITION OF %s FOR VALUES FROM (%%s) TO (%%s)'
+                % (quote(name), quote(TABLE)),
+                bounds,
+            )
+            return True
+
+        cursor.execute('ALTER TABLE %s DETACH PARTITION %s' % (
+            quote(TABLE), quote(DEFAULT_PARTITION),
+        ))
+        cursor.execute(
+            'CREATE TABLE %s PARTITION OF %s FOR VALUES FROM (%%s) TO (%%s)'
+            % (quote(name), quote(TABLE)),
+            bounds,
+        )
+        cursor.execute(
+            'WITH moved AS (DELETE FROM %s WHERE created >= %%s AND created < %%s RETURNING *) '
+            'INSERT INTO %s SELECT * FROM moved' % (quote(DEFAULT_PARTITION), quote(TABLE)),
+            bounds,
+        )
+        cursor.execute('ALTER TABLE %s ATTACH PARTITION %s DEFAULT' % (
+            quote(TABLE), quote(DEFAULT_PARTITION),
+        ))
+    return True
+
+
+def ensure_partitions(connection, start, end):
+    """Create the missing monthly partitions from `start` to `end` included."""
+    created = []
+    month = start.replace(day=1)
+    while month <= end:
+        if create_partition(connection, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
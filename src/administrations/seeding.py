@@ -0,0 +1,265 @@
+"""
+Synthetic customers and ledgers for local benchmarks and stress tests.
+
+Accounts are generated in chunks, each with its own random generator seeded
+with the seed and the chunk number, so the data does not depend on how many
+processes write it. Transfers stay within a chunk whose events are replayed
+in time order, balances never go negative and always match the ledger.
+"""
+import csv
+import io
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from customers.models import Customer
+from .models import BankInformation, BankStatement
+
+DEPOSIT, WITHDRAW, TRANSFER = 'deposit', 'withdraw', 'transfer'
+KINDS = [DEPOSIT, WITHDRAW, TRANSFER]
+KIND_WEIGHTS = [4, 3, 3]
+# Statements written by every kind of event.
+LEGS = {DEPOSIT: 1, WITHDRAW: 1, TRANSFER: 2}
+
+# Amounts in cents, log-normal around 50.000 and capped so that even the
+# busiest account stays far from the 15 digits of a balance.
+AMOUNT_MU = 15.4
+AMOUNT_SIGMA = 1.2
+MAX_AMOUNT = 10 ** 8
+
+FIRST_NAMES = ['adi', 'budi', 'citra', 'dewi', 'eka', 'fajar', 'gita', 'hadi',
+               'indah', 'joko', 'kartika', 'lestari', 'made', 'nur', 'putri', 'rizki']
+LAST_NAMES = ['santoso', 'wijaya', 'saputra', 'hidayat', 'kusuma', 'pratama',
+              'siregar', 'nasution', 'halim', 'gunawan', 'susanto', 'rahman']
+
+# Lookups by natural key are split, SQLite caps the parameters of a query.
+LOOKUP_BATCH_SIZE = 500
+
+
+def activity_weights(customers, skew, dormant, seed):
+    """
+    Share of the events of every account, Zipf weights `1 / rank ** skew`
+    over shuffled ranks, the `dormant` fraction of lowest ranks gets none.
+    """
+    ranks = list(range(1, customers + 1))
+    random.Random(seed).shuffle(ranks)
+    active = customers - int(customers * dormant)
+    return [0.0 if rank > active else 1 / rank ** skew for rank in ranks]
+
+
+def plan_chunks(customers, statements, chunk_size, skew, dormant, seed):
+    """Keyword arguments of `seed_chunk` for every chunk, but the shared ones."""
+    weights = activity_weights(customers, skew, dormant, seed)
+    total = sum(weights)
+    chunks = []
+    for number, first in enumerate(range(0, customers, chunk_size)):
+        chunk_weights = weights[first:first + chunk_size]
+        chunks.append({
+            'number': number,
+            'first': first,
+            'weights': chunk_weights,
+            'statements': round(statements * sum(chunk_weights) / total) if total else 0,
+        })
+    return chunks
+
+
+def simulate(rng, weights, statements, start, end):
+    """
+    About `statements` ledger entries between the accounts of a chunk, as
+    `(moment, kind, actor, receiver, cents)` events in time order. Debits
+    never exceed the balance, they turn into deposits on empty accounts.
+    Returns the final balances in cents and the events.
+    """
+    balances = [0] * len(weights)
+    events = []
+    if not statements or not any(weights):
+        return balances, events
+
+    legs = sum(LEGS[kind] * weight for kind, weight in zip(KINDS, KIND_WEIGHTS)) / sum(KIND_WEIGHTS)
+    count = max(round(statements / legs), 1)
+    accounts = range(len(weights))
+    span = (end - start).total_seconds()
+    moments = sorted(rng.random() * span for _ in range(count))
+    kinds = rng.choices(KINDS, KIND_WEIGHTS, k=count)
+    actors = rng.choices(accounts, weights, k=count)
+    receivers = rng.choices(accounts, weights, k=count)
+
+    for moment, kind, actor, receiver in zip(moments, kinds, actors, receivers):
+        cents = min(int(rng.lognormvariate(AMOUNT_MU, AMOUNT_SIGMA)) + 100, MAX_AMOUNT)
+        if kind == TRANSFER and receiver == actor:
+            kind = DEPOSIT
+        if kind != DEPOSIT:
+            if not balances[actor]:
+                kind = DEPOSIT
+            else:
+                cents = min(cents, balances[actor])
+
+        if kind == DEPOSIT:
+            balances[actor] += cents
+        else:
+            balances[actor] -= cents
+        if kind == TRANSFER:
+            balances[receiver] += cents
+        events.append((start + timedelta(seconds=moment), kind, actor, receiver, cents))
+    return balances, events
+
+
+def pks_by(queryset, field, values):
+    pks = {}
+    for index in range(0, len(values), LOOKUP_BATCH_SIZE):
+        pks.update(queryset.filter(**{
+            f'{field}__in': values[index:index + LOOKUP_BATCH_SIZE],
+        }).values_list(field, 'pk'))
+    return [pks[value] for value in values]
+
+
+def statement_rows(events, customer_pks, bank_pks):
+    for moment, kind, actor, receiver, cents in events:
+        amount = Decimal(cents).scaleb(-2)
+        if kind == TRANSFER:
+            for bank, is_debit, description in [
+                (actor, True, 'Amount transferred'),
+                (receiver, False, 'Amount received'),
+            ]:
+                yield BankStatement(
+                    bank_info_id=bank_pks[bank],
+                    sender_id=customer_pks[actor],
+                    receiver_id=customer_pks[receiver],
+                    amount=amount,
+                    is_debit=is_debit,
+                    description=description,
+                    created=moment,
+                    modified=moment,
+                )
+        else:
+            yield BankStatement(
+                bank_info_id=bank_pks[actor],
+                sender_id=customer_pks[actor],
+                receiver_id=customer_pks[actor],
+                amount=amount,
+                is_debit=kind == WITHDRAW,
+                description='Amount withdrawn' if kind == WITHDRAW else 'Amount deposit',
+                created=moment,
+                modified=moment,
+            )
+
+
+def copy_rows(model, instances):
+    """Load instances with a single COPY, PostgreSQL only."""
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for instance in instances:
+        # Unquoted empty values are read as NULL.
+        writer.writerow([
+            '' if value is None else value
+            for value in (getattr(instance, field.attname) for field in fields)
+        ])
+    buffer.seek(0)
+
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.copy_expert('COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (
+            quote(model._meta.db_table),
+            ', '.join(quote(field.column) for field in fields),
+        ), buffer)
+
+
+def insert_rows(model, instances):
+    """Insert instances with a single executemany, on any backend."""
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany('INSERT INTO %s (%s) VALUES (%s)' % (
+            quote(model._meta.db_table),
+            ', '.join(quote(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        ), [
+            [field.get_db_prep_save(getattr(instance, field.attname), connection) for field in fields]
+            for instance in instances
+        ])
+
+
+def write_rows(model, instances, batch_size):
+    """
+    Insert instances in batches as they are, unlike `bulk_create` the
+    `created` and `modified` values set on them are kept.
+    """
+    batch = []
+    for instance in instances:
+        batch.append(instance)
+        if len(batch) == batch_size:
+            write_batch(model, batch)
+            batch = []
+    if batch:
+        write_batch(model, batch)
+
+
+def write_batch(model, instances):
+    if connection.vendor == 'postgresql':
+        copy_rows(model, instances)
+    else:
+        insert_rows(model, instances)
+
+
+def seed_chunk(prefix, seed, number, first, weights, statements, start, end,
+               password, batch_size):
+    """
+    Write the customers, accounts and ledgers of a chunk in one transaction,
+    returns the number of statements written.
+    """
+    rng = random.Random(f'{seed}:{number}')
+    balances, events = simulate(rng, weights, statements, start, end)
+    people = [
+        (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng.choice([Customer.MALE, Customer.FEMALE]))
+        for _ in weights
+    ]
+    keys = [f'{prefix}-{first + index}' for index in range(len(weights))]
+    usernames = [f'{key}@example.com' for key in keys]
+
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(
+                username=username,
+                email=username,
+                first_name=first_name,
+                last_name=last_name,
+                password=password,
+                date_joined=start,
+            )
+            for username, (first_name, last_name, _) in zip(usernames, people)
+        ], batch_size=batch_size)
+        user_pks = pks_by(User.objects, 'username', usernames)
+
+        write_rows(Customer, (
+            Customer(
+                user_id=user_pk,
+                identity_number=key,
+                address='Seeded',
+                sex=sex,
+                created=start,
+                modified=start,
+            )
+            for user_pk, key, (_, _, sex) in zip(user_pks, keys, people)
+        ), batch_size)
+        customer_pks = pks_by(Customer.all_objects, 'identity_number', keys)
+
+        write_rows(BankInformation, (
+            BankInformation(
+                account_number=BankInformation.generate_account_number(),
+                holder_id=customer_pk,
+                is_active=True,
+                balance=Decimal(balance).scaleb(-2),
+                created=start,
+                modified=end,
+            )
+            for customer_pk, balance in zip(customer_pks, balances)
+        ), batch_size)
+        bank_pks = pks_by(BankInformation.all_objects, 'holder_id', customer_pks)
+
+        write_rows(BankStatement, statement_rows(events, customer_pks, bank_pks), batch_size)
+
+    return sum(LEGS[event[1]] for event in events)
@@ -1,11 +1,21 @@
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import transaction
-from rest_framework import serializers
+from django.db.models import Q
+from rest_framework import exceptions, serializers
 
+from cores.cache import ACCOUNT_SUMMARY, invalidate_summaries
+from cores.metrics import TimedSerializerMixin, timed
 from customers.models import Customer
-from .models import BankInformation, BankStatement
+from .account_numbers import is_valid_account_number
+from .group_commit import (GroupCommitTimeout, InactiveAccount, get_writer,
+                           write_statements)
+from .models import BankInformation, BankStatement, MonthlyStatementSummary
+from .services import lock_accounts, post_checked_statement
 
 
-class AccountSerializer(serializers.ModelSerializer):
+class AccountSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     holder = serializers.CharField(source='holder.user.get_full_name')
     balance = serializers.DecimalField(
         source='total_balance',
@@ -20,7 +30,24 @@ class AccountSerializer(serializers.ModelSerializer):
         ]
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class BalanceAsOfSerializer(TimedSerializerMixin, serializers.Serializer):
+    account_number = serializers.CharField()
+    as_of = serializers.DateTimeField()
+    balance = serializers.DecimalField(decimal_places=2, max_digits=15)
+
+
+class MonthlyStatementSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    month = serializers.DateField(format='%Y-%m')
+
+    class Meta:
+        model = MonthlyStatementSummary
+        fields = [
+            'month', 'opening_balance', 'closing_balance', 'total_credit',
+            'total_debit', 'transaction_count',
+        ]
+
+
+class TransactionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     bank_info = serializers.CharField(source='bank_info.account_number')
     sender = serializers.CharField(source='sender.user.get_full_name')
     receiver = serializers.CharField(source='receiver.user.get_full_name')
@@ -32,33 +59,72 @@ class TransactionSerializer(serializers.ModelSerializer):
         ]
 
 
-class DepositTransactionSerializer(serializers.Serializer):
-    sender = serializers.PrimaryKeyRelatedField(
-        queryset=Customer.objects.filter(is_deleted=False),
+class SenderField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolve the customer of the authenticated request from the principal,
+    without a query when it was built from the token claims.
+    """
+
+    def to_internal_value(self, data):
+        request = self.context.get('request')
+        customer = getattr(getattr(request, 'user', None), 'customer', None)
+        if customer is not None and str(customer.pk) == str(data):
+            return customer
+        return super(SenderField, self).to_internal_value(data)
+
+
+def inactive_error():
+    return serializers.ValidationError({
+        'sender': ['Bank account is blocked or inactive.']
+    })
+
+
+class GroupCommitUnavailable(exceptions.APIException):
+    status_code = 503
+    default_detail = 'The deposit was not written in time, nothing was recorded.'
+    default_code = 'group_commit_timeout'
+
+
+class DepositTransactionSerializer(TimedSerializerMixin, serializers.Serializer):
+    sender = SenderField(
+        queryset=Customer.objects.select_related('user', 'bankinformation'),
     )
     amount = serializers.DecimalField(max_digits=12, decimal_places=2)
 
-    def validate(self, attrs):
-        sender = attrs.get('sender')
-        if not sender.bankinformation.is_active:
-            raise serializers.ValidationError({
-                'sender': 'Bank account is blocked or inactive.'
-            })
-        return attrs
-
     def create(self, validated_data):
         sender = validated_data.get('sender')
         deposit_amount = validated_data.get('amount')
 
-        deposit = BankStatement()
-        deposit.bank_info = sender.bankinformation
-        deposit.sender = sender
-        deposit.receiver = sender
-        deposit.amount = deposit_amount
-        deposit.is_debit = False
-        deposit.description = 'Amount deposit'
-        deposit.save()
-
+        # The writer commits on its own connection, it cannot join a
+        # transaction the caller has open, like the one of `@idempotent`.
+        if settings.GROUP_COMMIT['ENABLED'] and not transaction.get_connection().in_atomic_block:
+            try:
+                deposit = get_writer().submit(BankStatement(
+                    bank_info=sender.bankinformation,
+                    sender=sender,
+                    receiver=sender,
+                    amount=deposit_amount,
+                    is_debit=False,
+                    description='Amount deposit',
+                ))
+            except InactiveAccount:
+                raise inactive_error()
+            except GroupCommitTimeout:
+                raise GroupCommitUnavailable()
+        else:
+            with transaction.atomic():
+                deposit = post_checked_statement(
+                    bank_info=sender.bankinformation,
+                    sender=sender,
+                    receiver=sender,
+                    amount=deposit_amount,
+                    is_debit=False,
+                    description='Amount deposit',
+                )
+            if deposit is None:
+                raise inactive_error()
+
+        # Every relation is already loaded, nothing is queried.
         serializer = TransactionSerializer(instance=deposit)
         return serializer.data
 
@@ -70,31 +136,31 @@ class WithdrawSerializer(DepositTransactionSerializer):
         sender = validated_data.get('sender')
         deposit_amount = validated_data.get('amount')
 
-        sender_bank = BankInformation.objects.select_for_update().get(
-            pk=sender.bankinformation.pk,
+        sender_bank = sender.bankinformation
+        deposit = post_checked_statement(
+            bank_info=sender_bank,
+            sender=sender,
+            receiver=sender,
+            amount=deposit_amount,
+            is_debit=True,
+            description='Amount withdrawn',
         )
 
-        if sender_bank.total_balance < deposit_amount:
+        if deposit is None:
+            # Only failures pay for finding out why.
+            if not BankInformation.all_objects.filter(pk=sender_bank.pk, is_active=True).exists():
+                raise inactive_error()
             raise serializers.ValidationError({
                 'amount': 'Insufficient funds.'
             })
 
-        deposit = BankStatement()
-        deposit.bank_info = sender.bankinformation
-        deposit.sender = sender
-        deposit.receiver = sender
-        deposit.amount = deposit_amount
-        deposit.is_debit = True
-        deposit.description = 'Amount withdrawn'
-        deposit.save()
-
         serializer = TransactionSerializer(instance=deposit)
         return serializer.data
 
 
-class TransferTransactionSerializer(serializers.Serializer):
-    sender = serializers.PrimaryKeyRelatedField(
-        queryset=Customer.objects.filter(is_deleted=False),
+class TransferTransactionSerializer(TimedSerializerMixin, serializers.Serializer):
+    sender = SenderField(
+        queryset=Customer.objects.select_related('user', 'bankinformation'),
     )
     destination_account_number = serializers.CharField()
     amount = serializers.DecimalField(max_digits=12, decimal_places=2)
@@ -105,11 +171,22 @@ class TransferTransactionSerializer(serializers.Serializer):
         amount = validated_data.get('amount')
         account_number = validated_data.get('destination_account_number')
 
-        try:
-            receiver_bank = BankInformation.objects.select_for_update().get(
-                account_number=account_number,
-            )
-        except BankInformation.DoesNotExist:
+        if not is_valid_account_number(account_number):
+            raise serializers.ValidationError({
+                'destination_account_number': 'Invalid account number.'
+            })
+
+        sender_bank_pk = sender.bankinformation.pk
+        accounts = lock_accounts(
+            Q(pk=sender_bank_pk) | Q(account_number=account_number),
+        )
+        sender_bank = accounts.get(sender_bank_pk)
+        receiver_bank = next((
+            account for account in accounts.values()
+            if account.account_number == account_number
+        ), None)
+
+        if receiver_bank is None:
             raise serializers.ValidationError({
                 'destination_account_number': 'Invalid account number.'
             })
@@ -119,51 +196,183 @@ class TransferTransactionSerializer(serializers.Serializer):
                 'receiver': 'Bank account is blocked or inactive.'
             })
 
-        if not sender.bankinformation.is_active:
+        if not sender_bank.is_active:
             raise serializers.ValidationError({
                 'sender': 'Bank account is blocked or inactive.'
             })
 
         # Ensure sender bank has sufficient balance.
-        sender_bank = BankInformation.objects.select_for_update().get(
-            pk=sender.bankinformation.pk,
-        )
         if sender_bank.total_balance < amount:
             raise serializers.ValidationError({
                 'amount': 'Insufficient funds.'
             })
 
-        # Bank statement for sender.
-        statement_sender = BankStatement()
-        statement_sender.bank_info = sender.bankinformation
-        statement_sender.sender = sender
-        statement_sender.receiver = receiver_bank.holder
-        statement_sender.amount = amount
-        statement_sender.is_debit = True
-        statement_sender.description = 'Amount transferred'
-        statement_sender.save()
-
-        # Bank statement for receiver.
-        statement_receiver = BankStatement()
-        statement_receiver.bank_info = receiver_bank
-        statement_receiver.sender = sender
-        statement_receiver.receiver = receiver_bank.holder
-        statement_receiver.amount = amount
-        statement_receiver.is_debit = False
-        statement_receiver.description = 'Amount received'
-        statement_receiver.save()
+        # Both legs in one multi-row insert, both balances in one UPDATE.
+        statement_sender = BankStatement(
+            bank_info=sender_bank,
+            sender=sender,
+            receiver=receiver_bank.holder,
+            amount=amount,
+            is_debit=True,
+            description='Amount transferred',
+        )
+        write_statements([
+            statement_sender,
+            BankStatement(
+                bank_info=receiver_bank,
+                sender=sender,
+                receiver=receiver_bank.holder,
+                amount=amount,
+                is_debit=False,
+                description='Amount received',
+            ),
+        ], accounts=accounts)
 
         serializer = TransactionSerializer(instance=statement_sender)
         return serializer.data
 
 
-class MutationSerializer(serializers.ModelSerializer):
+class TransferItemSerializer(serializers.Serializer):
+    destination_account_number = serializers.CharField()
+    amount = serializers.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        min_value=Decimal('0.01'),
+    )
+
+
+class BatchTransferSerializer(TimedSerializerMixin, serializers.Serializer):
+    sender = SenderField(
+        queryset=Customer.objects.select_related('user', 'bankinformation'),
+    )
+    items = TransferItemSerializer(many=True, allow_empty=False)
+    # Reject the whole batch when any item fails, otherwise skip failed items.
+    all_or_nothing = serializers.BooleanField(default=True)
+
+    @transaction.atomic
+    def create(self, validated_data):
+        sender = validated_data.get('sender')
+        items = validated_data.get('items')
+        all_or_nothing = validated_data.get('all_or_nothing')
+
+        sender_bank_pk = sender.bankinformation.pk
+        account_numbers = {
+            item['destination_account_number'] for item in items
+            if is_valid_account_number(item['destination_account_number'])
+        }
+        accounts = lock_accounts(
+            Q(pk=sender_bank_pk) | Q(account_number__in=account_numbers),
+        )
+        sender_bank = accounts[sender_bank_pk]
+        by_number = {account.account_number: account for account in accounts.values()}
+
+        if not sender_bank.is_active:
+            raise serializers.ValidationError({
+                'sender': 'Bank account is blocked or inactive.'
+            })
+
+        if all_or_nothing:
+            total = sum(item['amount'] for item in items)
+            if sender_bank.total_balance < total:
+                raise serializers.ValidationError({
+                    'amount': 'Insufficient funds.'
+                })
+
+        results = []
+        statements = []
+        transferred = []
+        for item in items:
+            account_number = item['destination_account_number']
+            amount = item['amount']
+            receiver_bank = by_number.get(account_number)
+            result = {
+                'destination_account_number': account_number,
+                'amount': str(amount),
+            }
+            results.append(result)
+
+            if receiver_bank is None:
+                result['error'] = {'destination_account_number': 'Invalid account number.'}
+            elif not receiver_bank.is_active:
+                result['error'] = {'receiver': 'Bank account is blocked or inactive.'}
+            elif sender_bank.balance < amount:
+                result['error'] = {'amount': 'Insufficient funds.'}
+            else:
+                sender_bank.balance -= amount
+                receiver_bank.balance += amount
+                statements.append(BankStatement(
+                    bank_info=sender_bank,
+                    sender=sender,
+                    receiver=receiver_bank.holder,
+                    amount=amount,
+                    is_debit=True,
+                    description='Amount transferred',
+                ))
+                statements.append(BankStatement(
+                    bank_info=receiver_bank,
+                    sender=sender,
+                    receiver=receiver_bank.holder,
+                    amount=amount,
+                    is_debit=False,
+                    description='Amount received',
+                ))
+                transferred.append((result, statements[-2]))
+
+        if all_or_nothing and len(transferred) < len(results):
+            raise serializers.ValidationError({'items': results})
+
+        # One multi-row insert for every leg and one UPDATE for every balance.
+        BankStatement.objects.bulk_create(statements)
+        BankInformation.all_objects.bulk_update(accounts.values(), ['balance'])
+        invalidate_summaries(
+            ACCOUNT_SUMMARY,
+            [account.holder_id for account in accounts.values()],
+        )
+
+        for result, statement in transferred:
+            # Only set on backends that return ids from bulk inserts.
+            result['id'] = statement.pk
+
+        return {
+            'transferred': len(transferred),
+            'failed': len(results) - len(transferred),
+            'results': results,
+        }
+
+
+class MutationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     sender = serializers.CharField(source='bank_info.account_number')
     status = serializers.SerializerMethodField()
 
+    # Columns needed by `represent_rows`.
+    row_fields = ['id', 'created', 'amount', 'is_debit', 'description']
+
     def get_status(self, obj):
         return 'Debit' if obj.is_debit else 'Credit'
 
+    @classmethod
+    def iter_rows(cls, rows, account_number):
+        """
+        Same output as `many=True` but from `.values(*row_fields)` rows of a
+        single account, without building a bound field per row.
+        """
+        created = serializers.DateTimeField()
+        amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+        for row in rows:
+            yield {
+                'id': row['id'],
+                'created': created.to_representation(row['created']),
+                'amount': amount.to_representation(row['amount']),
+                'status': 'Debit' if row['is_debit'] else 'Credit',
+                'sender': account_number,
+                'description': row['description'],
+            }
+
+    @classmethod
+    def represent_rows(cls, rows, account_number):
+        with timed('serializer'):
+            return list(cls.iter_rows(rows, account_number))
+
     class Meta:
         model = BankStatement
         fields = [
@@ -0,0 +1,247 @@
+import heapq
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Count, DateField, DecimalField, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from cores.cache import ACCOUNT_SUMMARY, invalidate_summaries
+
+from .models import (BalanceCheckpoint, BankInformation, BankStatement,
+                     MonthlyStatementSummary, ledger_sum)
+
+
+def post_statement(bank_info, sender, receiver, amount, is_debit, description):
+    """
+    Record a ledger entry and move the stored balance along with it.
+
+    Must be called inside `transaction.atomic` so both writes commit together.
+    """
+    statement = BankStatement.objects.create(
+        bank_info=bank_info,
+        sender=sender,
+        receiver=receiver,
+        amount=amount,
+        is_debit=is_debit,
+        description=description,
+    )
+
+    delta = -amount if is_debit else amount
+    BankInformation.all_objects.filter(pk=bank_info.pk).update(
+        balance=F('balance') + delta,
+    )
+    invalidate_summaries(ACCOUNT_SUMMARY, [bank_info.holder_id])
+    return statement
+
+
+def post_checked_statement(bank_info, sender, receiver, amount, is_debit, description):
+    """
+    Record a ledger entry without reading the account first, the balance is
+    moved by an UPDATE that only matches an active account, holding enough
+    funds for debits. Returns None and writes nothing when it does not match.
+
+    Must be called inside `transaction.atomic` so both writes commit together.
+    """
+    accounts = BankInformation.all_objects.filter(pk=bank_info.pk, is_active=True)
+    if is_debit:
+        accounts = accounts.filter(balance__gte=amount)
+
+    delta = -amount if is_debit else amount
+    if not accounts.update(balance=F('balance') + delta):
+        return None
+
+    statement = BankStatement.objects.create(
+        bank_info=bank_info,
+        sender=sender,
+        receiver=receiver,
+        amount=amount,
+        is_debit=is_debit,
+        description=description,
+    )
+    invalidate_summaries(ACCOUNT_SUMMARY, [bank_info.holder_id])
+    return statement
+
+
+def lock_accounts(condition):
+    """
+    Lock every account matching `condition` in a single statement, always in
+    ascending pk order so concurrent transfers between the same accounts
+    queue up instead of deadlocking. Returns the locked accounts by pk.
+    """
+    accounts = BankInformation.all_objects.select_for_update(
+        of=('self',),
+    ).select_related('holder__user').filter(condition).order_by('pk')
+    return {account.pk: account for account in accounts}
+
+
+def start_of_day(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def parse_moment(value, is_end=False):
+    """
+    Parse a timestamp or a date, a date used as the end of a range includes
+    the whole day. Returns None when the value is invalid.
+    """
+    try:
+        moment = parse_datetime(value)
+        date = None if moment else parse_date(value)
+    except ValueError:
+        return None
+    if moment is not None:
+        return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+    if date is None:
+        return None
+    if is_end:
+        date += timedelta(days=1)
+    return start_of_day(date)
+
+
+def build_balance_checkpoints(bank_info, until=None):
+    """
+    Append daily closing balances for every closed day after the latest
+    checkpoint of the account, returns the number of checkpoints created.
+    """
+    until = until or timezone.localdate()
+    last = bank_info.checkpoints.order_by('-date').first()
+
+    statements = BankStatement.all_objects.filter(
+        bank_info=bank_info,
+        created__lt=start_of_day(until),
+    )
+    balance = 0
+    if last is not None:
+        balance = last.closing_balance
+        statements = statements.filter(
+            created__gte=start_of_day(last.date + timedelta(days=1)),
+        )
+
+    daily = statements.annotate(
+        day=TruncDate('created'),
+    ).values('day').annotate(net=ledger_sum()).order_by('day')
+
+    checkpoints = []
+    for row in daily:
+        balance += row['net']
+        checkpoints.append(BalanceCheckpoint(
+            bank_info=bank_info,
+            date=row['day'],
+            closing_balance=balance,
+        ))
+
+    BalanceCheckpoint.objects.bulk_create(checkpoints)
+    return len(checkpoints)
+
+
+def balance_as_of(bank_info, moment):
+    """
+    Balance of the account at `moment`, the nearest checkpoint plus the
+    statements posted after it, so only the days since are scanned.
+    """
+    checkpoint = bank_info.checkpoints.filter(
+        date__lt=timezone.localdate(moment),
+    ).order_by('-date').first()
+
+    statements = BankStatement.all_objects.filter(bank_info=bank_info, created__lte=moment)
+    balance = 0
+    if checkpoint is not None:
+        balance = checkpoint.closing_balance
+        statements = statements.filter(
+            created__gte=start_of_day(checkpoint.date + timedelta(days=1)),
+        )
+
+    return balance + statements.aggregate(total=ledger_sum())['total']
+
+
+def monthly_totals(statements):
+    """Credit, debit, count and last id of the statements per account and month."""
+    amount = DecimalField(max_digits=15, decimal_places=2)
+    return statements.annotate(
+        month=TruncMonth('created', output_field=DateField()),
+    ).values('bank_info_id', 'month').annotate(
+        credit=Coalesce(Sum('amount', filter=Q(is_debit=False)), Value(0), output_field=amount),
+        debit=Coalesce(Sum('amount', filter=Q(is_debit=True)), Value(0), output_field=amount),
+        count=Count('id'),
+        last=Max('id'),
+    ).order_by('bank_info_id', 'month')
+
+
+def stale_months(ledger, summaries):
+    """
+    Months of `ledger` (rows of `monthly_totals`) and `summaries`, both in
+    account and month order, whose totals differ or which only one side holds.
+    """
+    rows = heapq.merge(
+        (((row['bank_info_id'], row['month']), (row['count'], row['credit'], row['debit']))
+         for row in ledger),
+        (((summary.bank_info_id, summary.month),
+          (summary.transaction_count, summary.total_credit, summary.total_debit))
+         for summary in summaries),
+        key=itemgetter(0),
+    )
+    for key, group in groupby(rows, key=itemgetter(0)):
+        totals = [row[1] for row in group]
+        if len(totals) != 2 or totals[0] != totals[1]:
+            yield key
+
+
+def stale_summary_accounts():
+    """
+    Accounts whose monthly summaries do not match their statements. Months are
+    compared by their totals instead of the highest statement id, a statement
+    committed after a newer one was summarized still changes its month.
+    """
+    ledger = monthly_totals(BankStatement.all_objects.all()).iterator()
+    summaries = MonthlyStatementSummary.objects.order_by('bank_info_id', 'month').iterator()
+    stale = []
+    for bank_info_id, _ in stale_months(ledger, summaries):
+        if not stale or stale[-1] != bank_info_id:
+            stale.append(bank_info_id)
+    return stale
+
+
+def build_monthly_summaries(bank_info_id):
+    """
+    Rebuild the monthly summaries of an account from the first month whose
+    totals do not match its statements, months before it are left untouched.
+    Returns the number of months written.
+    """
+    summaries = MonthlyStatementSummary.objects.filter(bank_info_id=bank_info_id)
+    monthly = list(monthly_totals(
+        BankStatement.all_objects.filter(bank_info_id=bank_info_id),
+    ))
+
+    stale = next(stale_months(monthly, summaries.order_by('month')), None)
+    if stale is None:
+        return 0
+
+    start = stale[1]
+    previous = summaries.filter(month__lt=start).order_by('-month').first()
+    balance = previous.closing_balance if previous is not None else 0
+
+    rebuilt = []
+    for row in monthly:
+        if row['month'] < start:
+            continue
+        opening = balance
+        balance += row['credit'] - row['debit']
+        rebuilt.append(MonthlyStatementSummary(
+            bank_info_id=bank_info_id,
+            month=row['month'],
+            opening_balance=opening,
+            closing_balance=balance,
+            total_credit=row['credit'],
+            total_debit=row['debit'],
+            transaction_count=row['count'],
+            last_statement_id=row['last'],
+        ))
+
+    # Upsert of the rebuilt months.
+    with transaction.atomic():
+        summaries.filter(month__gte=start).delete()
+        MonthlyStatementSummary.objects.bulk_create(rebuilt)
+    return len(rebuilt)
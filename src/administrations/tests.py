@@ -1,10 +1,31 @@
+import json
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework import status
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework import serializers, status
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
 
+from cores.authentication import ClaimsJWTAuthentication, CustomerTokenObtainPairSerializer
+from cores.cache import summary_stats
 from customers.models import Customer
-from .models import BankInformation, BankStatement
+from .account_numbers import allocate_block, format_account_number, is_valid_account_number
+from .group_commit import GroupCommitTimeout, GroupCommitWriter, InactiveAccount
+from .models import (AccountNumberSequence, BalanceCheckpoint, BankInformation, BankStatement,
+                     IdempotencyKey, MonthlyStatementSummary)
+from .partitioning import add_months, is_partitioned, partition_name
+from .services import balance_as_of, post_statement, stale_summary_accounts
+from .serializers import TransferTransactionSerializer
 from .views import BankInformationViewSet, DepositViewSet, TransferViewSet, WithdrawViewSet
 
 
@@ -34,17 +55,18 @@ class BankInformationAPITest(APITestCase):
 
     @classmethod
     def create_deposit(cls, bank, amount):
-        deposit = BankStatement()
-        deposit.bank_info = bank
-        deposit.sender = bank.holder
-        deposit.receiver = bank.holder
-        deposit.amount = amount
-        deposit.is_debit = False
-        deposit.description = 'Amount deposit'
-        deposit.save()
+        post_statement(
+            bank_info=bank,
+            sender=bank.holder,
+            receiver=bank.holder,
+            amount=amount,
+            is_debit=False,
+            description='Amount deposit',
+        )
 
     def setUp(self):
         self.factory = APIRequestFactory()
+        cache.clear()
 
     def test_retrieve_rekening_information(self):
         self.register_customer('tester@gmail.com', '123456')
@@ -57,6 +79,43 @@ class BankInformationAPITest(APITestCase):
         response = view(request)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def run_commit_hooks(self):
+        # The test transaction never commits, run what a commit would.
+        callbacks, connection.run_on_commit = connection.run_on_commit, []
+        for _, callback in callbacks:
+            callback()
+
+    def test_account_summary_cache(self):
+        self.register_customer('tester@gmail.com', '123456')
+        customer = Customer.objects.get(user__username='tester@gmail.com')
+        bank_info = customer.bankinformation
+        token = CustomerTokenObtainPairSerializer.get_token(customer.user).access_token
+        principal = ClaimsJWTAuthentication().get_user(token)
+        self.run_commit_hooks()
+
+        url = reverse('v1:accounts:bankinformation-list')
+        view = BankInformationViewSet.as_view({'get': 'list'})
+        request = self.factory.get(path=url)
+        force_authenticate(request, principal)
+        view(request)
+
+        request = self.factory.get(path=url)
+        force_authenticate(request, principal)
+        with self.assertNumQueries(0):
+            response = view(request)
+        self.assertEqual(response.data['balance'], '0.00')
+        self.assertEqual(summary_stats(), {'hits': 1, 'misses': 1})
+
+        self.create_deposit(bank_info, 1000)
+        request = self.factory.get(path=url)
+        force_authenticate(request, principal)
+        self.assertEqual(view(request).data['balance'], '0.00')
+
+        self.run_commit_hooks()
+        request = self.factory.get(path=url)
+        force_authenticate(request, principal)
+        self.assertEqual(view(request).data['balance'], '1000.00')
+
     def test_rekening_activation_another_customer(self):
         self.register_customer('tester1@gmail.com', '123456')
         customer1 = Customer.objects.get(user__username='tester1@gmail.com')
@@ -137,6 +196,57 @@ class BankInformationAPITest(APITestCase):
         mutation = bank_info.mutations.first()
         self.assertEqual(mutation.description, 'Amount deposit')
 
+    def test_group_commit_flush(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        self.register_customer('customer2@gmail.com', '54321')
+        self.register_customer('customer3@gmail.com', '67890')
+        BankInformation.objects.exclude(holder__user__username='customer3@gmail.com').update(is_active=True)
+        banks = list(BankInformation.objects.order_by('pk'))
+
+        batch = []
+        for bank_info, amount in [(banks[0], 100), (banks[1], 50), (banks[2], 10), (banks[0], 25)]:
+            statement = BankStatement(
+                bank_info=bank_info,
+                sender=bank_info.holder,
+                receiver=bank_info.holder,
+                amount=amount,
+                is_debit=False,
+                description='Amount deposit',
+            )
+            batch.append((statement, Future()))
+        GroupCommitWriter(window_ms=5, max_batch_size=10).flush(batch)
+
+        # The inactive account fails alone.
+        inactive = batch.pop(2)
+        with self.assertRaises(InactiveAccount):
+            inactive[1].result(timeout=0)
+        for statement, future in batch:
+            self.assertIsNotNone(future.result(timeout=0).pk)
+        for bank_info, balance in zip(banks, [125, 50, 0]):
+            bank_info.refresh_from_db()
+            self.assertEqual(bank_info.balance, balance)
+            self.assertEqual(bank_info.ledger_balance(), balance)
+
+    def test_group_commit_writer_recovery(self):
+        writer = GroupCommitWriter(window_ms=5, max_batch_size=10, timeout=0.01)
+        writer.run = lambda: None
+        writer.ensure_started()
+        writer.thread.join()
+
+        # A dead writer thread is replaced by the next submit.
+        dead = writer.thread
+        with self.assertLogs('administrations.group_commit', 'ERROR'):
+            writer.ensure_started()
+        self.assertIsNot(writer.thread, dead)
+        writer.thread.join()
+
+        # Nobody writes the queue, the deposit is given up and never written.
+        with self.assertLogs('administrations.group_commit', 'ERROR'), \
+                self.assertRaises(GroupCommitTimeout):
+            writer.submit(BankStatement(amount=1, is_debit=False))
+        statement, future = writer.queue.get_nowait()
+        self.assertTrue(future.cancelled())
+
     def test_deposit_inactive_rekening(self):
         self.register_customer('tester@gmail.com', '123456')
         customer = Customer.objects.get(user__username='tester@gmail.com')
@@ -173,6 +283,79 @@ class BankInformationAPITest(APITestCase):
         mutation = bank_info.mutations.latest('pk')
         self.assertEqual(mutation.description, 'Amount withdrawn')
 
+    def test_withdraw_rekening_with_idempotency_key(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_info = customer.bankinformation
+        bank_info.is_active = True
+        bank_info.save()
+        self.create_deposit(bank_info, 100)
+
+        url = reverse('v1:administrations:withdraw-list')
+        view = WithdrawViewSet.as_view({'post': 'create'})
+        responses = []
+        for amount in [10, 10, 20]:
+            request = self.factory.post(
+                path=url,
+                data={'amount': amount},
+                HTTP_IDEMPOTENCY_KEY='withdraw-1',
+            )
+            force_authenticate(request, customer.user)
+            responses.append(view(request))
+
+        bank_info.refresh_from_db()
+        self.assertEqual(responses[0].status_code, status.HTTP_201_CREATED)
+        self.assertEqual(responses[1].status_code, status.HTTP_201_CREATED)
+        self.assertEqual(responses[1].data, responses[0].data)
+        self.assertEqual(responses[1]['Idempotent-Replayed'], 'true')
+        self.assertEqual(responses[2].status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(bank_info.balance, 90)
+        self.assertEqual(bank_info.mutations.count(), 2)
+
+    @override_settings(GROUP_COMMIT=dict(settings.GROUP_COMMIT, ENABLED=True))
+    def test_idempotent_deposit_skips_group_commit(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        BankInformation.objects.update(is_active=True)
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+
+        url = reverse('v1:accounts:deposit-list')
+        request = self.factory.post(path=url, data={'amount': 100}, HTTP_IDEMPOTENCY_KEY='deposit-1')
+        force_authenticate(request, customer.user)
+        view = DepositViewSet.as_view({'post': 'create'})
+        with mock.patch('administrations.serializers.get_writer') as get_writer:
+            response = view(request)
+
+        # Written in the transaction of the idempotency key.
+        get_writer.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        record = IdempotencyKey.objects.get(key='deposit-1')
+        self.assertEqual(record.response, response.data)
+        self.assertEqual(customer.bankinformation.mutations.count(), 1)
+
+    def test_failed_request_does_not_keep_idempotency_key(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+
+        url = reverse('v1:accounts:deposit-list')
+        request = self.factory.post(path=url, data={'amount': 100}, HTTP_IDEMPOTENCY_KEY='deposit-1')
+        force_authenticate(request, customer.user)
+        view = DepositViewSet.as_view({'post': 'create'})
+        response = view(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_purge_idempotency_keys(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        for key in ['old', 'new']:
+            IdempotencyKey.objects.create(customer=customer, key=key, request_hash='')
+        IdempotencyKey.objects.filter(key='old').update(
+            created=datetime.now(timezone.utc) - timedelta(days=2),
+        )
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
     def test_withdraw_from_inactive_rekening(self):
         self.register_customer('customer1@gmail.com', '12345')
         customer = Customer.objects.get(user__email='customer1@gmail.com')
@@ -351,6 +534,108 @@ class BankInformationAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(str(response.data['destination_account_number']), 'Invalid account number.')
 
+    def test_batch_transfer(self):
+        banks = []
+        for index in range(3):
+            email = f'customer{index}@gmail.com'
+            self.register_customer(email, str(index))
+            bank_info = BankInformation.objects.get(holder__user__email=email)
+            bank_info.is_active = True
+            bank_info.save()
+            banks.append(bank_info)
+        self.create_deposit(banks[0], 1000)
+
+        data = {
+            'items': [
+                {'destination_account_number': banks[1].account_number, 'amount': 300},
+                {'destination_account_number': banks[2].account_number, 'amount': 200},
+                {'destination_account_number': banks[1].account_number, 'amount': 100},
+            ],
+        }
+        url = reverse('v1:administrations:transfer-batch')
+        request = self.factory.post(path=url, data=data, format='json')
+        force_authenticate(request, banks[0].holder.user)
+        view = TransferViewSet.as_view({'post': 'batch'})
+        response = view(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['transferred'], 3)
+        for bank_info, balance in zip(banks, [400, 400, 200]):
+            bank_info.refresh_from_db()
+            self.assertEqual(bank_info.balance, balance)
+            self.assertEqual(bank_info.ledger_balance(), balance)
+
+    def test_batch_transfer_all_or_nothing(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        bank_customer1 = BankInformation.objects.get(holder__user__email='customer1@gmail.com')
+        bank_customer1.is_active = True
+        bank_customer1.save()
+        self.create_deposit(bank_customer1, 1000)
+
+        self.register_customer('customer2@gmail.com', '54321')
+        bank_customer2 = BankInformation.objects.get(holder__user__email='customer2@gmail.com')
+        bank_customer2.is_active = True
+        bank_customer2.save()
+
+        items = [
+            {'destination_account_number': bank_customer2.account_number, 'amount': 300},
+            {'destination_account_number': 'HIYAHIYAHIYA', 'amount': 100},
+            {'destination_account_number': bank_customer2.account_number, 'amount': 900},
+        ]
+        url = reverse('v1:administrations:transfer-batch')
+        view = TransferViewSet.as_view({'post': 'batch'})
+
+        request = self.factory.post(path=url, data={'items': items}, format='json')
+        force_authenticate(request, bank_customer1.holder.user)
+        response = view(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(bank_customer2.mutations.count(), 0)
+
+        data = {'items': items, 'all_or_nothing': False}
+        request = self.factory.post(path=url, data=data, format='json')
+        force_authenticate(request, bank_customer1.holder.user)
+        response = view(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['transferred'], 1)
+        self.assertEqual(
+            [result.get('error') for result in response.data['results']],
+            [
+                None,
+                {'destination_account_number': 'Invalid account number.'},
+                {'amount': 'Insufficient funds.'},
+            ],
+        )
+        bank_customer1.refresh_from_db()
+        self.assertEqual(bank_customer1.balance, 700)
+
+    def test_generate_account_number(self):
+        numbers = {BankInformation.generate_account_number() for _ in range(250)}
+        self.assertEqual(len(numbers), 250)
+        self.assertTrue(all(is_valid_account_number(number) for number in numbers))
+
+        number = format_account_number(42)
+        mistyped = number[:5] + str((int(number[5]) + 1) % 10) + number[6:]
+        self.assertFalse(is_valid_account_number(mistyped))
+        self.assertTrue(is_valid_account_number('0123456789ABC'))
+
+    def test_bank_transfer_to_mistyped_rekening(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer1 = Customer.objects.get(user__email='customer1@gmail.com')
+        self.register_customer('customer2@gmail.com', '54321')
+        account_number = Customer.objects.get(
+            user__email='customer2@gmail.com',
+        ).bankinformation.account_number
+
+        serializer = TransferTransactionSerializer(data={
+            'sender': customer1.pk,
+            'destination_account_number': account_number[:-1] + str((int(account_number[-1]) + 1) % 10),
+            'amount': 10,
+        })
+        self.assertTrue(serializer.is_valid())
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaises(serializers.ValidationError):
+                serializer.save()
+        self.assertFalse(any('bankinformation' in query['sql'] for query in queries))
+
     def test_retrieve_rekening_mutations(self):
         self.register_customer('customer1@gmail.com', '12345')
         customer = Customer.objects.get(user__email='customer1@gmail.com')
@@ -369,6 +654,168 @@ class BankInformationAPITest(APITestCase):
         response = view(request, guid=bank_info.guid)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_retrieve_rekening_mutations_with_cursor(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_info = customer.bankinformation
+        for amount in [100, 200, 300]:
+            self.create_deposit(bank_info, amount)
+
+        url = reverse(
+            'v1:administrations:bankinformation-mutations',
+            args=[bank_info.guid.hex],
+        )
+        view = BankInformationViewSet.as_view(
+            {'get': 'mutations'}, **BankInformationViewSet.mutations.kwargs,
+        )
+        request = self.factory.get(path=url, data={'page_size': 2})
+        force_authenticate(request, customer.user)
+        response = view(request, guid=bank_info.guid)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([m['amount'] for m in response.data['results']], ['300.00', '200.00'])
+        self.assertIsNone(response.data['previous'])
+
+        query = parse_qs(urlparse(response.data['next']).query)
+        request = self.factory.get(path=url, data={'page_size': 2, 'cursor': query['cursor'][0]})
+        force_authenticate(request, customer.user)
+        response = view(request, guid=bank_info.guid)
+        self.assertEqual([m['amount'] for m in response.data['results']], ['100.00'])
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+
+    def test_retrieve_rekening_mutations_query_count(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_info = customer.bankinformation
+
+        url = reverse(
+            'v1:administrations:bankinformation-mutations',
+            args=[bank_info.guid.hex],
+        )
+        view = BankInformationViewSet.as_view(
+            {'get': 'mutations'}, **BankInformationViewSet.mutations.kwargs,
+        )
+        for count in [5, 50]:
+            while bank_info.mutations.count() < count:
+                self.create_deposit(bank_info, 100)
+
+            request = self.factory.get(path=url)
+            force_authenticate(request, User.objects.get(pk=customer.user.pk))
+            with self.assertNumQueries(3):
+                response = view(request, guid=bank_info.guid)
+            self.assertEqual(len(response.data['results']), count)
+
+    def test_detail_actions_resolve_ownership_in_one_query(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_info = customer.bankinformation
+        token = CustomerTokenObtainPairSerializer.get_token(customer.user).access_token
+        principal = ClaimsJWTAuthentication().get_user(token)
+
+        url = reverse('v1:accounts:bankinformation-activate', args=[bank_info.guid])
+        request = self.factory.put(path=url)
+        force_authenticate(request, principal)
+        view = BankInformationViewSet.as_view({'put': 'activate'})
+        with self.assertNumQueries(1):
+            response = view(request, guid=bank_info.guid)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        bank_info.refresh_from_db()
+        self.assertTrue(bank_info.is_active)
+
+        request = self.factory.put(path=url)
+        force_authenticate(request, principal)
+        response = view(request, guid='not-a-guid')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        url = reverse('v1:administrations:bankinformation-mutations', args=[bank_info.guid.hex])
+        request = self.factory.get(path=url)
+        force_authenticate(request, principal)
+        view = BankInformationViewSet.as_view(
+            {'get': 'mutations'}, **BankInformationViewSet.mutations.kwargs,
+        )
+        with self.assertNumQueries(2):
+            response = view(request, guid=bank_info.guid)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_write_actions_query_budget(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        self.register_customer('customer2@gmail.com', '54321')
+        BankInformation.objects.update(is_active=True)
+        customer1 = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_customer2 = BankInformation.objects.get(holder__user__email='customer2@gmail.com')
+        token = CustomerTokenObtainPairSerializer.get_token(customer1.user).access_token
+        # The atomic block adds a SAVEPOINT and its RELEASE in the test transaction.
+        savepoint = 2
+
+        def post(view_set, path, data):
+            request = self.factory.post(path=path, data=data)
+            force_authenticate(request, ClaimsJWTAuthentication().get_user(token))
+            return view_set.as_view({'post': 'create'})(request)
+
+        with self.assertNumQueries(2 + savepoint):
+            response = post(DepositViewSet, reverse('v1:accounts:deposit-list'), {'amount': 100})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['sender'], 'tester quality')
+        self.assertEqual(response.data['bank_info'], customer1.bankinformation.account_number)
+
+        with self.assertNumQueries(2 + savepoint):
+            response = post(WithdrawViewSet, reverse('v1:administrations:withdraw-list'), {'amount': 10})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Lock, insert of both legs, balances, SQLite inserts them one by one.
+        inserts = 1 if connection.features.can_return_rows_from_bulk_insert else 2
+        with self.assertNumQueries(2 + inserts + savepoint):
+            response = post(TransferViewSet, reverse('v1:administrations:transfer-list'), {
+                'destination_account_number': bank_customer2.account_number,
+                'amount': 30,
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['receiver'], 'tester quality')
+
+        self.assertEqual(
+            dict(BankInformation.objects.values_list('holder__user__email', 'balance')),
+            {'customer1@gmail.com': 60, 'customer2@gmail.com': 30},
+        )
+
+        # Failures only cost an extra query.
+        with self.assertNumQueries(3 + savepoint):
+            response = post(WithdrawViewSet, reverse('v1:administrations:withdraw-list'), {'amount': 500})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(response.data['amount']), 'Insufficient funds.')
+
+    def test_export_rekening_mutations(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_info = customer.bankinformation
+        for amount in [100, 200, 300]:
+            self.create_deposit(bank_info, amount)
+        first, second, third = bank_info.mutations.order_by('id')
+        BankStatement.objects.filter(pk=first.pk).update(created=datetime(2020, 1, 31, 23, tzinfo=timezone.utc))
+        BankStatement.objects.filter(pk=second.pk).update(created=datetime(2020, 2, 1, tzinfo=timezone.utc))
+
+        url = reverse('v1:administrations:bankinformation-export', args=[bank_info.guid.hex])
+        view = BankInformationViewSet.as_view({'get': 'export'})
+
+        def export(**params):
+            request = self.factory.get(path=url, data=params)
+            force_authenticate(request, customer.user)
+            return view(request, guid=bank_info.guid)
+
+        response = export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,created,amount,status,sender,description')
+        self.assertEqual(lines[1].split(',')[2:4], ['100.00', 'Credit'])
+        self.assertEqual(len(lines), 4)
+
+        response = export(file_format='ndjson', start='2020-02-01', end='2020-02-01')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([record['id'] for record in records], [second.pk])
+        self.assertEqual(records[0]['sender'], bank_info.account_number)
+
+        self.assertEqual(export(file_format='xml').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(export(start='yesterday').status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_retrieve_rekening_mutations_from_another_customer_account(self):
         self.register_customer('customer1@gmail.com', '12345')
         customer1 = Customer.objects.get(user__email='customer1@gmail.com')
@@ -392,3 +839,211 @@ class BankInformationAPITest(APITestCase):
         view = BankInformationViewSet.as_view({'get': 'mutations'})
         response = view(request, guid=bank_customer1.guid)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stored_balance_matches_ledger(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_info = customer.bankinformation
+        bank_info.is_active = True
+        bank_info.save()
+        self.create_deposit(bank_info, 1000)
+
+        url = reverse('v1:administrations:withdraw-list')
+        request = self.factory.post(path=url, data={'amount': 250})
+        force_authenticate(request, customer.user)
+        view = WithdrawViewSet.as_view({'post': 'create'})
+        view(request)
+        bank_info.refresh_from_db()
+        self.assertEqual(bank_info.balance, 750)
+        self.assertEqual(bank_info.ledger_balance(), 750)
+
+    def test_reconcile_balances(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_info = customer.bankinformation
+        self.create_deposit(bank_info, 1000)
+        BankInformation.objects.filter(pk=bank_info.pk).update(balance=5)
+
+        call_command('reconcile_balances', '--dry-run', stdout=StringIO())
+        bank_info.refresh_from_db()
+        self.assertEqual(bank_info.balance, 5)
+
+        call_command('reconcile_balances', stdout=StringIO())
+        bank_info.refresh_from_db()
+        self.assertEqual(bank_info.balance, 1000)
+
+    def test_seed_bank(self):
+        options = {
+            'customers': 40, 'statements': 600, 'seed': 7, 'days': 30, 'end': '2020-02-01',
+            'workers': 1, 'chunk_size': 15, 'stdout': StringIO(),
+        }
+        call_command('seed_bank', prefix='first', **options)
+        call_command('seed_bank', prefix='second', **options)
+
+        def ledgers(prefix):
+            accounts = BankInformation.objects.filter(
+                holder__user__username__startswith=f'{prefix}-',
+            ).order_by('holder__identity_number')
+            return [
+                (account.balance, list(account.mutations.order_by('created', 'id').values_list(
+                    'amount', 'is_debit', 'description', 'created',
+                )))
+                for account in accounts
+            ]
+
+        first = ledgers('first')
+        self.assertEqual(len(first), 40)
+        # Timestamps are written as generated, the model fields are left alone.
+        created = Customer.objects.filter(user__username__startswith='first-').values_list('created', flat=True)
+        self.assertEqual(set(created), {datetime(2020, 1, 2, tzinfo=timezone.utc)})
+        self.assertTrue(Customer._meta.get_field('created').auto_now_add)
+        self.assertTrue(BankStatement._meta.get_field('modified').auto_now)
+        self.assertEqual(first, ledgers('second'))
+
+        counts = sorted(len(statements) for _, statements in first)
+        self.assertGreater(counts[-1], 5 * counts[len(counts) // 2])
+        self.assertEqual(counts[:int(40 * 0.3)], [0] * int(40 * 0.3))
+
+        for balance, statements in first:
+            running = 0
+            for amount, is_debit, _, created in statements:
+                running += -amount if is_debit else amount
+                self.assertGreaterEqual(running, 0)
+                self.assertTrue(datetime(2020, 1, 2, tzinfo=timezone.utc) <= created
+                                < datetime(2020, 2, 1, tzinfo=timezone.utc))
+            self.assertEqual(balance, running)
+
+    def test_monthly_summaries(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_info = customer.bankinformation
+
+        def post(month, amount, is_debit=False):
+            post_statement(bank_info, customer, customer, amount, is_debit, 'Amount')
+            BankStatement.objects.filter(pk=bank_info.mutations.latest('pk').pk).update(
+                created=datetime(2020, month, 10, tzinfo=timezone.utc),
+            )
+
+        post(1, 100)
+        post(1, 30, is_debit=True)
+        post(3, 50)
+        call_command('build_monthly_summaries', workers=1, stdout=StringIO())
+        summaries = MonthlyStatementSummary.objects.filter(bank_info=bank_info).order_by('month')
+        self.assertEqual(
+            [(s.opening_balance, s.total_credit, s.total_debit, s.transaction_count, s.closing_balance)
+             for s in summaries],
+            [(0, 100, 30, 2, 70), (70, 50, 0, 1, 120)],
+        )
+
+        # Only months from the one with new statements onwards are rebuilt.
+        january = summaries[0]
+        post(2, 5, is_debit=True)
+        call_command('build_monthly_summaries', workers=1, stdout=StringIO())
+        self.assertEqual(summaries.get(month=date(2020, 1, 1)).pk, january.pk)
+        self.assertEqual(
+            [(s.month.month, s.opening_balance, s.closing_balance) for s in summaries.all()],
+            [(1, 0, 70), (2, 70, 65), (3, 65, 115)],
+        )
+
+        url = reverse('v1:administrations:bankinformation-summaries', args=[bank_info.guid.hex])
+        view = BankInformationViewSet.as_view({'get': 'summaries'})
+        request = self.factory.get(path=url, data={'month': '2020-02'})
+        force_authenticate(request, customer.user)
+        response = view(request, guid=bank_info.guid)
+        self.assertEqual(response.data['closing_balance'], '65.00')
+        self.assertEqual(response.data['month'], '2020-02')
+
+        request = self.factory.get(path=url)
+        force_authenticate(request, customer.user)
+        response = view(request, guid=bank_info.guid)
+        self.assertEqual([row['month'] for row in response.data['results']], ['2020-03', '2020-02', '2020-01'])
+
+        request = self.factory.get(path=url, data={'month': 'march'})
+        force_authenticate(request, customer.user)
+        response = view(request, guid=bank_info.guid)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_monthly_summaries_late_statement(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_info = customer.bankinformation
+        with transaction.atomic():
+            late = post_statement(bank_info, customer, customer, 100, False, 'Amount')
+            post_statement(bank_info, customer, customer, 50, False, 'Amount')
+
+        # The lower id commits after the higher one was summarized.
+        BankStatement.all_objects.filter(pk=late.pk).delete()
+        call_command('build_monthly_summaries', workers=1, stdout=StringIO())
+        self.assertEqual(MonthlyStatementSummary.objects.get(bank_info=bank_info).total_credit, 50)
+        BankStatement.all_objects.bulk_create([late])
+
+        self.assertEqual(stale_summary_accounts(), [bank_info.pk])
+        call_command('build_monthly_summaries', workers=1, stdout=StringIO())
+        summary = MonthlyStatementSummary.objects.get(bank_info=bank_info)
+        self.assertEqual((summary.total_credit, summary.transaction_count), (150, 2))
+        self.assertEqual(summary.closing_balance, bank_info.ledger_balance())
+        self.assertEqual(stale_summary_accounts(), [])
+
+    def test_statement_partitions(self):
+        self.assertEqual(add_months(date(2020, 11, 1), 3), date(2021, 2, 1))
+        self.assertEqual(partition_name(date(2021, 2, 1)), 'administrations_bankstatement_202102')
+
+        # Other databases keep the plain table.
+        out = StringIO()
+        call_command('create_statement_partitions', convert=True, stdout=out)
+        self.assertIn('nothing to do', out.getvalue())
+        self.assertFalse(is_partitioned(connection))
+
+    def test_balance_as_of(self):
+        self.register_customer('customer1@gmail.com', '12345')
+        customer = Customer.objects.get(user__email='customer1@gmail.com')
+        bank_info = customer.bankinformation
+        for day, amount in [(1, 100), (2, 50), (2, 25), (4, 10)]:
+            self.create_deposit(bank_info, amount)
+            BankStatement.objects.filter(pk=bank_info.mutations.latest('pk').pk).update(
+                created=datetime(2020, 1, day, 12, tzinfo=timezone.utc),
+            )
+
+        call_command('build_balance_checkpoints', stdout=StringIO())
+        closing = BalanceCheckpoint.objects.filter(bank_info=bank_info).order_by('date')
+        self.assertEqual([c.closing_balance for c in closing], [100, 175, 185])
+        # Rebuilding only appends days after the latest checkpoint.
+        call_command('build_balance_checkpoints', stdout=StringIO())
+        self.assertEqual(closing.count(), 3)
+
+        moment = datetime(2020, 1, 2, 13, tzinfo=timezone.utc)
+        self.assertEqual(balance_as_of(bank_info, moment), 175)
+        moment = datetime(2020, 1, 3, tzinfo=timezone.utc)
+        self.assertEqual(balance_as_of(bank_info, moment), 175)
+        moment = datetime(2020, 1, 4, 11, tzinfo=timezone.utc)
+        self.assertEqual(balance_as_of(bank_info, moment), 175)
+        moment = datetime(2019, 12, 31, tzinfo=timezone.utc)
+        self.assertEqual(balance_as_of(bank_info, moment), 0)
+
+        url = reverse('v1:accounts:bankinformation-list')
+        request = self.factory.get(path=url, data={'as_of': '2020-01-01T18:00:00Z'})
+        force_authenticate(request, customer.user)
+        view = BankInformationViewSet.as_view({'get': 'list'})
+        response = view(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['balance'], '100.00')
+
+        request = self.factory.get(path=url, data={'as_of': 'yesterday'})
+        force_authenticate(request, customer.user)
+        response = view(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AccountNumberBlockTest(TransactionTestCase):
+
+    def test_block_survives_rollback(self):
+        # Any backend but PostgreSQL and SQLite claims blocks on a connection
+        # of its own.
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                first = allocate_block(100)
+                raise RuntimeError('signup failed')
+            second = allocate_block(100)
+
+        self.assertEqual(second, first + 100)
+        self.assertEqual(AccountNumberSequence.objects.get().next_block, second // 100 + 1)
@@ -1,5 +1,6 @@
 from rest_framework import routers
 
+from cores.asynchronous import async_read_urls
 from . import views
 
 app_name = 'administrations'
@@ -10,4 +11,4 @@ router.register('deposit', views.DepositViewSet, basename='deposit')
 router.register('transfer', views.TransferViewSet, basename='transfer')
 router.register('withdraw', views.WithdrawViewSet, basename='withdraw')
 
-urlpatterns = router.urls
+urlpatterns = async_read_urls(router.urls, ['bankinformation-list', 'bankinformation-mutations'])
@@ -1,69 +1,184 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from cores.cache import ACCOUNT_SUMMARY, cached_summary, invalidate_summaries
+from cores.db import ReplicaReadMixin
 from cores.permissions import IsBankOwner, IsCustomer
+from .exports import EXPORT_FORMATS, export_lines, keyset_rows
+from .idempotency import idempotent
 from .models import BankInformation, BankStatement
-from .serializers import (AccountSerializer, DepositTransactionSerializer,
-                          TransferTransactionSerializer, WithdrawSerializer,
-                          MutationSerializer)
+from .pagination import MutationCursorPagination
+from .serializers import (AccountSerializer, BalanceAsOfSerializer,
+                          BatchTransferSerializer, DepositTransactionSerializer,
+                          MonthlyStatementSummarySerializer, MutationSerializer,
+                          TransferTransactionSerializer, WithdrawSerializer)
+from .services import balance_as_of, parse_moment
 
 
-class BankInformationViewSet(mixins.ListModelMixin,
+class BankInformationViewSet(ReplicaReadMixin,
+                             mixins.ListModelMixin,
                              viewsets.GenericViewSet):
     serializer_class = AccountSerializer
     permission_classes = [IsCustomer]
-    queryset = BankInformation.objects.filter(is_deleted=False)
+    queryset = BankInformation.objects.all()
     lookup_field = 'guid'
+    replica_actions = {'list', 'mutations', 'summaries'}
 
     def get_serializer_class(self):
-        if self.action == 'mutations':
+        if self.action in ('mutations', 'export'):
             return MutationSerializer
+        if self.action == 'summaries':
+            return MonthlyStatementSummarySerializer
         return super(BankInformationViewSet, self).get_serializer_class()
 
     def get_queryset(self):
         queryet = super(BankInformationViewSet, self).get_queryset()
-        return queryet.filter(holder=self.request.user.customer)
+        # Ownership is joined through the customer to the authenticated user,
+        # the lookup and the check cost a single query.
+        return queryet.filter(holder__user_id=self.request.user.pk)
+
+    def set_active(self, is_active):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            updated = self.get_queryset().filter(**{
+                self.lookup_field: self.kwargs[lookup_url_kwarg],
+            }).update(is_active=is_active, modified=timezone.now())
+        except (TypeError, ValueError, ValidationError):
+            updated = 0
+        if not updated:
+            raise Http404
+        invalidate_summaries(ACCOUNT_SUMMARY, [self.request.user.customer.pk])
 
     def list(self, request, *args, **kwargs):
         customer = request.user.customer
-        bank_info = customer.bankinformation
-        data = self.get_serializer(instance=bank_info).data
+
+        if 'as_of' in request.query_params:
+            bank_info = self.get_queryset().get(holder_id=customer.pk)
+            return self.balance_as_of(bank_info, request.query_params['as_of'])
+
+        def build():
+            bank_info = self.get_queryset().select_related('holder__user').get(
+                holder_id=customer.pk,
+            )
+            return self.get_serializer(instance=bank_info).data
+
+        data = cached_summary(ACCOUNT_SUMMARY, customer.pk, build)
 
         return Response(data)
 
+    def balance_as_of(self, bank_info, value):
+        moment = parse_moment(value)
+        if moment is None:
+            return Response(
+                {'as_of': 'Invalid timestamp.'},
+                status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = BalanceAsOfSerializer(instance={
+            'account_number': bank_info.account_number,
+            'as_of': moment,
+            'balance': balance_as_of(bank_info, moment),
+        })
+        return Response(serializer.data)
+
     @action(methods=['put'], detail=True, permission_classes=[IsBankOwner])
     def activate(self, request, **kwargs):
-        bank_info = self.get_object()
-        bank_info.is_active = True
-        bank_info.save()
+        self.set_active(is_active=True)
 
         return Response(status=status.HTTP_200_OK)
 
     @action(methods=['put'], detail=True, permission_classes=[IsBankOwner])
     def deactivate(self, request, **kwargs):
-        bank_info = self.get_object()
-        bank_info.is_active = False
-        bank_info.save()
+        self.set_active(is_active=False)
 
         return Response(status=status.HTTP_200_OK)
 
-    @action(methods=['get'], detail=True, permission_classes=[IsBankOwner])
+    @action(methods=['get'], detail=True, permission_classes=[IsBankOwner],
+            pagination_class=MutationCursorPagination)
     def mutations(self, request, **kwargs):
         bank_info = self.get_object()
-        mutations = bank_info.mutations.filter(is_deleted=False).order_by('-created')
+        serializer_class = self.get_serializer_class()
+        mutations = bank_info.mutations.filter(
+            is_deleted=False,
+        ).values(*serializer_class.row_fields)
         mutations = self.paginate_queryset(mutations)
-        serializer = self.get_serializer(instance=mutations, many=True)
+        data = serializer_class.represent_rows(mutations, bank_info.account_number)
+
+        return self.get_paginated_response(data)
+
+    @action(methods=['get'], detail=True, permission_classes=[IsBankOwner])
+    def export(self, request, **kwargs):
+        """
+        Stream the whole history as CSV or NDJSON, `?file_format=` (`format`
+        is taken by DRF) with optional `?start=` and `?end=` dates.
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'file_format': f'Must be one of {sorted(EXPORT_FORMATS)}.'},
+                status.HTTP_400_BAD_REQUEST,
+            )
+
+        bank_info = self.get_object()
+        mutations = bank_info.mutations.filter(is_deleted=False)
+        for param, lookup, is_end in [('start', 'created__gte', False), ('end', 'created__lt', True)]:
+            if param in request.query_params:
+                moment = parse_moment(request.query_params[param], is_end)
+                if moment is None:
+                    return Response({param: 'Invalid date.'}, status.HTTP_400_BAD_REQUEST)
+                mutations = mutations.filter(**{lookup: moment})
+
+        serializer_class = self.get_serializer_class()
+        # Fetched a chunk at a time while streaming.
+        rows = keyset_rows(
+            mutations.order_by('created', 'id').values(*serializer_class.row_fields),
+            settings.EXPORT_CHUNK_SIZE,
+        )
+        records = serializer_class.iter_rows(rows, bank_info.account_number)
+
+        content_type, _ = EXPORT_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            export_lines(records, serializer_class.Meta.fields, file_format),
+            content_type=content_type,
+        )
+        filename = f'{bank_info.account_number}.{file_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(methods=['get'], detail=True, permission_classes=[IsBankOwner])
+    def summaries(self, request, **kwargs):
+        """Monthly summaries newest first, or a single month with `?month=YYYY-MM`."""
+        bank_info = self.get_object()
+        summaries = bank_info.monthly_summaries.order_by('-month')
+        serializer_class = self.get_serializer_class()
+
+        if 'month' in request.query_params:
+            try:
+                month = datetime.strptime(request.query_params['month'], '%Y-%m').date()
+            except ValueError:
+                return Response({'month': 'Expected YYYY-MM.'}, status.HTTP_400_BAD_REQUEST)
+            summary = get_object_or_404(summaries, month=month)
+            return Response(serializer_class(instance=summary).data)
 
-        return self.get_paginated_response(serializer.data)
+        page = self.paginate_queryset(summaries)
+        return self.get_paginated_response(serializer_class(instance=page, many=True).data)
 
 
 class DepositViewSet(mixins.CreateModelMixin,
                      viewsets.GenericViewSet):
     serializer_class = DepositTransactionSerializer
     permission_classes = [IsCustomer]
-    queryset = BankStatement.objects.filter(is_deleted=False)
+    queryset = BankStatement.objects.all()
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         data = request.data.copy()
         data['sender'] = request.user.customer.pk
@@ -78,8 +193,14 @@ class TransferViewSet(mixins.CreateModelMixin,
                       viewsets.GenericViewSet):
     serializer_class = TransferTransactionSerializer
     permission_classes = [IsCustomer]
-    queryset = BankStatement.objects.filter(is_deleted=False)
+    queryset = BankStatement.objects.all()
 
+    def get_serializer_class(self):
+        if self.action == 'batch':
+            return BatchTransferSerializer
+        return super(TransferViewSet, self).get_serializer_class()
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         data = request.data.copy()
         data['sender'] = request.user.customer.pk
@@ -89,13 +210,18 @@ class TransferViewSet(mixins.CreateModelMixin,
             return Response(response, status.HTTP_201_CREATED)
         return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['post'], detail=False)
+    def batch(self, request, *args, **kwargs):
+        return self.create(request, *args, **kwargs)
+
 
 class WithdrawViewSet(mixins.CreateModelMixin,
                       viewsets.GenericViewSet):
     serializer_class = WithdrawSerializer
     permission_classes = [IsCustomer]
-    queryset = BankStatement.objects.filter(is_deleted=False)
+    queryset = BankStatement.objects.all()
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         data = request.data.copy()
         data['sender'] = request.user.customer.pk
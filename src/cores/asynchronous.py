@@ -0,0 +1,84 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .metrics import recording, timed
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_READ_WORKERS,
+                thread_name_prefix='async-read',
+            )
+    return _executor
+
+
+def run_view(view, request, *args, **kwargs):
+    # Pool threads outlive requests, handle their connections like Django
+    # does around every request.
+    close_old_connections()
+    try:
+        with recording(getattr(request, 'timings', None)):
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                # Rendered here rather than on the event loop's sync thread.
+                with timed('render'):
+                    response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def run_isolated(func, *args):
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def run_off_event_loop(func, *args):
+    """
+    Call `func(*args)` right away, or in the read pool when this thread runs
+    an event loop, where Django refuses to query. Django 3.1 iterates
+    streaming responses on the event loop, the loop waits for the result.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return func(*args)
+    return get_executor().submit(run_isolated, func, *args).result()
+
+
+def async_view(view):
+    """
+    Turn a blocking view into a coroutine running it in a bounded thread
+    pool, so slow queries only hold a pool thread instead of a worker.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(),
+            functools.partial(run_view, view, request, *args, **kwargs),
+        )
+    return wrapper
+
+
+def async_read_urls(urlpatterns, names):
+    """Serve the named url patterns with `async_view` in ASGI deployments."""
+    if settings.ASYNC_READ_VIEWS:
+        for pattern in urlpatterns:
+            if pattern.name in names:
+                pattern.callback = async_view(pattern.callback)
+    return urlpatterns
@@ -0,0 +1,114 @@
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from administrations.models import BankInformation
+from customers.models import Customer
+from .metrics import timed
+
+DENYLIST_KEY = 'auth:denylist:{}'
+
+
+def deny_user(user_id):
+    """
+    Reject the tokens already issued to a user. Entries live as long as a
+    refresh token, after that no token of the user can still be valid.
+    """
+    timeout = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    cache.set(DENYLIST_KEY.format(user_id), True, timeout=timeout)
+
+
+def allow_user(user_id):
+    cache.delete(DENYLIST_KEY.format(user_id))
+
+
+def is_denied(user_id):
+    return cache.get(DENYLIST_KEY.format(user_id), False)
+
+
+class CustomerTokenObtainPairSerializer(TokenObtainPairSerializer):
+
+    @classmethod
+    def get_token(cls, user):
+        token = super(CustomerTokenObtainPairSerializer, cls).get_token(user)
+
+        # Claims are copied from the refresh token to every access token.
+        customer = getattr(user, 'customer', None)
+        if customer is not None:
+            bank_info = customer.bankinformation
+            token['customer_id'] = customer.pk
+            token['bank_id'] = bank_info.pk
+            token['bank_guid'] = str(bank_info.guid)
+            token['account_number'] = bank_info.account_number
+            token['first_name'] = user.first_name
+            token['last_name'] = user.last_name
+        return token
+
+
+class CustomerTokenUser(TokenUser):
+    """
+    Request principal built from the token claims alone, `customer` is a
+    Customer instance with every field but its keys deferred. Its `user` and
+    `bankinformation` are attached from the claims too, the names as of when
+    the token was issued.
+    """
+
+    @cached_property
+    def customer(self):
+        if 'customer_id' not in self.token:
+            # Keeps `hasattr(user, 'customer')` false for non-customers.
+            raise AttributeError('customer')
+        customer = Customer.from_db(
+            DEFAULT_DB_ALIAS,
+            ['id', 'user_id'],
+            [self.token['customer_id'], self.id],
+        )
+        if 'account_number' in self.token:
+            customer.user = User.from_db(
+                DEFAULT_DB_ALIAS,
+                ['id', 'first_name', 'last_name'],
+                [self.id, self.token['first_name'], self.token['last_name']],
+            )
+            customer.bankinformation = BankInformation.from_db(
+                DEFAULT_DB_ALIAS,
+                ['id', 'guid', 'account_number', 'holder_id'],
+                [self.bank_id, uuid.UUID(self.bank_guid),
+                 self.token['account_number'], customer.pk],
+            )
+        return customer
+
+    @cached_property
+    def bank_id(self):
+        return self.token.get('bank_id')
+
+    @cached_property
+    def bank_guid(self):
+        return self.token.get('bank_guid')
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Authenticate tokens issued with customer claims without loading the
+    user, older tokens still go through the database.
+    """
+
+    def authenticate(self, request):
+        with timed('auth'):
+            return super(ClaimsJWTAuthentication, self).authenticate(request)
+
+    def get_user(self, validated_token):
+        if 'customer_id' not in validated_token:
+            return super(ClaimsJWTAuthentication, self).get_user(validated_token)
+
+        user = CustomerTokenUser(validated_token)
+        if is_denied(user.id):
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
@@ -0,0 +1,82 @@
+"""
+PostgreSQL backend drawing its connections from a process wide pool.
+
+Configured with a `POOL` entry in the database settings, see
+`DATABASE_POOL` in the project settings.
+"""
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from django.db.backends.postgresql import base
+
+from cores.pool import ConnectionPool, get_pool
+
+
+def connect(conn_params, options):
+    connection = base.Database.connect(**conn_params)
+    if 'isolation_level' in options and options['isolation_level'] != connection.isolation_level:
+        connection.set_session(isolation_level=options['isolation_level'])
+    # Same as the stock backend, see DatabaseWrapper.get_new_connection().
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+def ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def reset(connection):
+    if connection.closed:
+        return False
+    status = connection.info.transaction_status
+    if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        # Never hand out an open transaction, nor the locks it holds.
+        connection.rollback()
+    return True
+
+
+def create_pool(settings_dict, conn_params):
+    options = settings_dict.get('POOL', {})
+    return ConnectionPool(
+        connect=lambda: connect(conn_params, settings_dict['OPTIONS']),
+        ping=ping,
+        reset=reset,
+        close=lambda connection: connection.close(),
+        min_size=options.get('MIN_SIZE', 0),
+        max_size=options.get('MAX_SIZE', 10),
+        max_lifetime=options.get('MAX_LIFETIME'),
+        timeout=options.get('TIMEOUT', 5),
+        pre_ping=options.get('PRE_PING', True),
+    )
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        # Built and filled on first use only, a dictionary lookup after that.
+        return get_pool(
+            self.alias,
+            lambda: create_pool(self.settings_dict, self.get_connection_params()),
+        )
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.acquire()
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level,
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps referencing a connection closed inside
+                # `atomic`, it must not go back to the pool.
+                self.pool.discard(self.connection)
+            else:
+                self.pool.release(self.connection)
@@ -0,0 +1,224 @@
+"""
+Endpoint benchmarks, every route of the administrations and customers apps
+is driven through the test client against a seeded data set, measuring its
+latency, queries and allocations per request.
+"""
+import math
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from administrations import urls as administrations_urls
+from administrations.management.utils import create_throwaway_customers
+from administrations.models import BankInformation, BankStatement
+from administrations.services import build_monthly_summaries
+from customers import urls as customers_urls
+from customers.models import Customer
+from .authentication import CustomerTokenObtainPairSerializer
+
+BENCHMARKED_URLS = [administrations_urls, customers_urls]
+
+INITIAL_BALANCE = 1000000
+
+# Budgets can be set for any of these result fields.
+METRICS = ['p50_ms', 'p95_ms', 'p99_ms', 'queries', 'allocated_kib']
+
+
+def routes():
+    """`METHOD app:url-name` of every route of the benchmarked apps."""
+    for module in BENCHMARKED_URLS:
+        for pattern in module.urlpatterns:
+            for method in pattern.callback.actions:
+                yield f'{method.upper()} {module.app_name}:{pattern.name}'
+
+
+def account_detail(accounts, index, **request):
+    return dict(request, args=[accounts[index % len(accounts)].bankinformation.guid])
+
+
+def transfer(accounts, index):
+    receiver = accounts[(index + 1) % len(accounts)].bankinformation
+    return {'data': {'destination_account_number': receiver.account_number, 'amount': '1'}}
+
+
+def batch_transfer(accounts, index):
+    receivers = [accounts[(index + step) % len(accounts)].bankinformation for step in (1, 2)]
+    return {'data': {'items': [
+        {'destination_account_number': receiver.account_number, 'amount': '1'}
+        for receiver in receivers
+    ]}}
+
+
+def register(accounts, index):
+    return {'anonymous': True, 'data': {
+        'first_name': 'bench',
+        'last_name': 'customer',
+        'address': 'Benchmark',
+        'sex': Customer.MALE,
+        'identity_number': f'bench-new-{index}',
+        'email': f'bench-new-{index}@example.com',
+        'password': 'benchmark123',
+    }}
+
+
+# Request of the `index`th iteration of every route, run in this order,
+# deactivated accounts are activated again before any write.
+SCENARIOS = {
+    'GET administrations:bankinformation-list': lambda accounts, index: {},
+    'GET administrations:bankinformation-mutations': account_detail,
+    'GET administrations:bankinformation-export': lambda accounts, index: account_detail(
+        accounts, index, data={'file_format': 'csv'},
+    ),
+    'GET administrations:bankinformation-summaries': account_detail,
+    'PUT administrations:bankinformation-deactivate': account_detail,
+    'PUT administrations:bankinformation-activate': account_detail,
+    'POST administrations:deposit-list': lambda accounts, index: {'data': {'amount': '1'}},
+    'POST administrations:withdraw-list': lambda accounts, index: {'data': {'amount': '1'}},
+    'POST administrations:transfer-list': transfer,
+    'POST administrations:transfer-batch': batch_transfer,
+    'GET customers:customer-list': lambda accounts, index: {},
+    'POST customers:customer-list': register,
+}
+
+
+def uncovered_routes():
+    return sorted(set(routes()) - set(SCENARIOS))
+
+
+def seed(customers, statements):
+    """
+    Active customers holding `statements` deposits each, summaries built,
+    returned with their access token as `token`.
+    """
+    accounts = create_throwaway_customers('bench', customers, INITIAL_BALANCE)
+    BankStatement.objects.bulk_create([
+        BankStatement(
+            bank_info=customer.bankinformation,
+            sender=customer,
+            receiver=customer,
+            amount=1,
+            is_debit=False,
+            description='Amount deposit',
+        )
+        for customer in accounts
+        for _ in range(statements)
+    ], batch_size=1000)
+    BankInformation.all_objects.filter(holder__in=accounts).update(
+        balance=F('balance') + statements,
+    )
+
+    for customer in accounts:
+        build_monthly_summaries(customer.bankinformation.pk)
+        customer.token = str(CustomerTokenObtainPairSerializer.get_token(customer.user).access_token)
+    return accounts
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * percent / 100) - 1, 0)]
+
+
+class Runner:
+
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.client = Client()
+        # Reads may be routed to any of these.
+        self.aliases = [DEFAULT_DB_ALIAS] + list(settings.REPLICA_DATABASES)
+
+    def send(self, route, index):
+        method, name = route.split(' ')
+        request = SCENARIOS[route](self.accounts, index)
+        path = reverse(f'v1:{name}', args=request.get('args'))
+        extra = {}
+        if not request.get('anonymous'):
+            extra['HTTP_AUTHORIZATION'] = f'Bearer {self.accounts[index % len(self.accounts)].token}'
+
+        send = getattr(self.client, method.lower())
+        if method == 'GET':
+            response = send(path, request.get('data'), **extra)
+        else:
+            response = send(path, request.get('data', {}), content_type='application/json', **extra)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def measure(self, route, index):
+        with ExitStack() as stack:
+            captures = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in self.aliases
+            ]
+            started = time.perf_counter()
+            status_code = self.send(route, index)
+            elapsed = time.perf_counter() - started
+        return status_code, elapsed, sum(len(capture.captured_queries) for capture in captures)
+
+    def run(self, route, iterations, allocation_samples):
+        statuses = Counter()
+        latencies = []
+        queries = []
+        for index in range(iterations):
+            status_code, elapsed, count = self.measure(route, index)
+            statuses[status_code] += 1
+            latencies.append(elapsed * 1000)
+            queries.append(count)
+
+        # Tracing slows every allocation down, it gets its own requests.
+        allocations = []
+        tracemalloc.start()
+        try:
+            for index in range(iterations, iterations + allocation_samples):
+                tracemalloc.clear_traces()
+                self.send(route, index)
+                allocations.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'requests': iterations,
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+            'errors': sum(count for code, count in statuses.items() if code >= 400),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'queries': max(queries),
+            'queries_mean': round(statistics.mean(queries), 2),
+            'allocated_kib': round(statistics.median(allocations), 1) if allocations else None,
+        }
+
+
+def run(accounts, iterations, allocation_samples=5):
+    """Results of every route in SCENARIOS, by route."""
+    runner = Runner(accounts)
+    return {
+        route: runner.run(route, iterations, allocation_samples)
+        for route in SCENARIOS
+    }
+
+
+def check_budgets(results, budgets):
+    """Messages for every metric over its budget, `budgets` maps routes to metric limits."""
+    failures = []
+    for route, limits in budgets.items():
+        result = results.get(route)
+        if result is None:
+            failures.append(f'{route}: not benchmarked.')
+            continue
+        for metric, limit in limits.items():
+            if metric not in METRICS:
+                failures.append(f'{route}: unknown metric {metric}.')
+                continue
+            value = result[metric]
+            if value is not None and value > limit:
+                failures.append(f'{route}: {metric} {value} over the {limit} budget.')
+    return failures
@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .db import primary_reads
+
+ACCOUNT_SUMMARY = 'account'
+CUSTOMER_PROFILE = 'customer'
+
+SUMMARY_KEY = 'summary:{}:{}'
+VERSION_KEY = 'summary:version:{}:{}'
+STATS_KEY = 'summary:stats:{}'
+
+
+def summary_key(kind, customer_id):
+    return SUMMARY_KEY.format(kind, customer_id)
+
+
+def version_key(kind, customer_id):
+    return VERSION_KEY.format(kind, customer_id)
+
+
+def count(name):
+    key = STATS_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First event since the cache started, a lost increment is fine.
+        cache.set(key, 1, timeout=None)
+
+
+def cached_summary(kind, customer_id, build):
+    """
+    Return the serialized payload of a customer, `build()` is only called on
+    a miss and its result is kept until a write invalidates it.
+
+    Payloads are stored with the version of the customer read before the
+    build, every committed write bumps it. A payload built while a write
+    committed carries the old version and is never served.
+    """
+    key = summary_key(kind, customer_id)
+    current = version_key(kind, customer_id)
+    entries = cache.get_many([key, current])
+    version = entries.get(current, 0)
+    if key in entries and entries[key][0] == version:
+        count('hits')
+        return entries[key][1]
+
+    count('misses')
+    # Built from the primary, a lagging replica must not be cached.
+    with primary_reads():
+        data = build()
+    cache.set(key, (version, data), timeout=settings.SUMMARY_CACHE_TTL)
+    return data
+
+
+def bump_versions(keys, versions):
+    cache.delete_many(keys)
+    for key in versions:
+        # Versions never expire, a reset one could match an older payload.
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def invalidate_summaries(kind, customer_ids):
+    """
+    Drop the cached payloads once the current transaction commits, a reader
+    never repopulates the cache from data that is about to roll back.
+    """
+    customer_ids = set(customer_ids)
+    keys = [summary_key(kind, customer_id) for customer_id in customer_ids]
+    versions = [version_key(kind, customer_id) for customer_id in customer_ids]
+    transaction.on_commit(lambda: bump_versions(keys, versions))
+
+
+def summary_stats():
+    hits = cache.get(STATS_KEY.format('hits'), 0)
+    misses = cache.get(STATS_KEY.format('misses'), 0)
+    return {'hits': hits, 'misses': misses}
@@ -0,0 +1,89 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = 'db:pin:{}'
+
+# Reads are only sent to a replica while a view explicitly allows it,
+# everything else, writes and locking reads included, stays on the primary.
+replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def primary_reads():
+    token = replica_reads.set(False)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def pin_to_primary(user_id):
+    """Keep the reads of a user who just wrote on the primary for a while."""
+    cache.set(PIN_KEY.format(user_id), True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(PIN_KEY.format(user_id), False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads of replica enabled views to one of REPLICA_DATABASES, the
+    replicas are expected to be kept up to date by the database itself.
+    """
+
+    def db_for_read(self, model, **hints):
+        if settings.REPLICA_DATABASES and replica_reads.get():
+            return random.choice(settings.REPLICA_DATABASES)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.REPLICA_DATABASES
+
+
+class ReplicaReadMixin:
+    """
+    Viewset mixin reading from a replica in the safe requests of
+    `replica_actions`, unless the user wrote in the last
+    REPLICA_STICKY_SECONDS.
+    """
+    replica_actions = set()
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and permission checks still read from the primary.
+        super(ReplicaReadMixin, self).initial(request, *args, **kwargs)
+        if (request.method in SAFE_METHODS
+                and self.action in self.replica_actions
+                and not is_pinned(request.user.pk)):
+            replica_reads.set(True)
+
+    def dispatch(self, request, *args, **kwargs):
+        with primary_reads():
+            return super(ReplicaReadMixin, self).dispatch(request, *args, **kwargs)
+
+
+class PrimaryPinMiddleware(MiddlewareMixin):
+    """Pin the user of every write request to the primary."""
+
+    def process_response(self, request, response):
+        # DRF copies the user it authenticated to the Django request.
+        user = getattr(request, 'user', None)
+        if (request.method not in SAFE_METHODS
+                and settings.REPLICA_DATABASES
+                and user is not None and user.is_authenticated):
+            pin_to_primary(user.pk)
+        return response
@@ -0,0 +1,42 @@
+"""
+API docs served under `docs/`, built on their first request so that worker
+processes never serving them skip the schema machinery at boot.
+"""
+from functools import lru_cache
+
+from django.urls import path
+
+app_name = 'api-docs'
+
+TITLE = 'Simple Bank API'
+
+
+@lru_cache(maxsize=None)
+def get_views():
+    from rest_framework.documentation import get_docs_view, get_schemajs_view
+    from rest_framework.schemas import SchemaGenerator
+
+    class PrecomputedSchemaGenerator(SchemaGenerator):
+        """The docs are public, the schema is generated once per process."""
+
+        def get_schema(self, request=None, public=False):
+            if not hasattr(self, 'schema'):
+                self.schema = super(PrecomputedSchemaGenerator, self).get_schema(request, public)
+            return self.schema
+
+    options = {'title': TITLE, 'generator_class': PrecomputedSchemaGenerator}
+    return get_docs_view(**options), get_schemajs_view(**options)
+
+
+def docs_index(request, *args, **kwargs):
+    return get_views()[0](request, *args, **kwargs)
+
+
+def schema_js(request, *args, **kwargs):
+    return get_views()[1](request, *args, **kwargs)
+
+
+urlpatterns = [
+    path('', docs_index, name='docs-index'),
+    path('schema.js', schema_js, name='schema-js'),
+]
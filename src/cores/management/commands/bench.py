@@ -0,0 +1,100 @@
+import json
+import shutil
+import tempfile
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from django.utils import timezone
+
+from cores import benchmarks
+from cores.metrics import registry
+
+# The cached summaries of the seeded customers never reach the shared cache.
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database, drive every route of the accounts '
+            'and customers apps through the test client and report latency '
+            'percentiles, queries and allocations per request.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=20)
+        parser.add_argument('--statements', type=int, default=200,
+                            help='Seeded statements per account.')
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Timed requests per route.')
+        parser.add_argument('--allocation-samples', type=int, default=5,
+                            help='Extra requests per route traced with tracemalloc.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--budgets',
+                            help='JSON file of per route budgets, fail when one is exceeded.')
+
+    def handle(self, *args, **options):
+        uncovered = benchmarks.uncovered_routes()
+        if uncovered:
+            raise CommandError(f'No benchmark scenario for {", ".join(uncovered)}.')
+
+        budgets = None
+        if options['budgets']:
+            with open(options['budgets']) as budgets_file:
+                budgets = json.load(budgets_file)
+
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        # Nor do their requests reach the metrics of the running servers.
+        metrics_directory = tempfile.mkdtemp()
+        metrics = dict(settings.METRICS, DIRECTORY=metrics_directory)
+        try:
+            with override_settings(CACHES=BENCH_CACHES, METRICS=metrics):
+                accounts = benchmarks.seed(options['customers'], options['statements'])
+                results = benchmarks.run(
+                    accounts, options['iterations'], options['allocation_samples'],
+                )
+            vendor = connection.vendor
+        finally:
+            registry.reset()
+            shutil.rmtree(metrics_directory)
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(
+            f'{"route":<50} {"p50":>8} {"p95":>8} {"p99":>8} {"queries":>8} {"KiB":>8}  errors'
+        )
+        for route, result in results.items():
+            self.stdout.write(
+                f'{route:<50} {result["p50_ms"]:>6.1f}ms {result["p95_ms"]:>6.1f}ms '
+                f'{result["p99_ms"]:>6.1f}ms {result["queries"]:>8} '
+                f'{result["allocated_kib"] or 0:>8.0f}  {result["errors"]}'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({
+                    'created': timezone.now().isoformat(),
+                    'django': django.get_version(),
+                    'database': vendor,
+                    'customers': options['customers'],
+                    'statements': options['statements'],
+                    'iterations': options['iterations'],
+                    'results': results,
+                }, output, indent=2)
+
+        failed = [route for route, result in results.items() if result['errors']]
+        if failed:
+            raise CommandError(f'Requests failed on {", ".join(failed)}.')
+
+        if budgets is not None:
+            failures = benchmarks.check_budgets(results, budgets)
+            if failures:
+                raise CommandError('\n'.join(failures))
+            self.stdout.write(self.style.SUCCESS('Every endpoint is within its budget.'))
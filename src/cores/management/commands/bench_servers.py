@@ -0,0 +1,128 @@
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.reverse import reverse
+
+from administrations.management.utils import (create_throwaway_customers,
+                                              delete_throwaway_customers)
+from administrations.services import post_statement
+from cores.authentication import CustomerTokenObtainPairSerializer
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of a process and all its descendants (Linux)."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as children:
+                    pending.extend(int(child) for child in children.read().split())
+        except OSError:
+            continue
+    return total
+
+
+class Command(BaseCommand):
+    help = ('Serve the API with gunicorn (WSGI, sync workers) then uvicorn '
+            '(ASGI, async read views) with the same number of processes, and '
+            'compare concurrent reads of the mutations endpoint.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--mutations', type=int, default=200,
+                            help='Statements of the benchmarked account.')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        customer = create_throwaway_customers(prefix, 1, 0)[0]
+        bank_info = customer.bankinformation
+        with transaction.atomic():
+            for _ in range(options['mutations']):
+                post_statement(bank_info, customer, customer, 1, False, 'Amount deposit')
+
+        token = CustomerTokenObtainPairSerializer.get_token(customer.user).access_token
+        path = reverse('v1:administrations:bankinformation-mutations', args=[bank_info.guid.hex])
+        address = f'127.0.0.1:{options["port"]}'
+        servers = {
+            'wsgi': [sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()',
+                     'simplebanking.wsgi',
+                     '--workers', str(options['processes']), '--bind', address],
+            'asgi': [sys.executable, '-m', 'uvicorn', 'simplebanking.asgi:application',
+                     '--workers', str(options['processes']), '--port', str(options['port'])],
+        }
+
+        try:
+            for mode, command in servers.items():
+                server = subprocess.Popen(
+                    command,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    start_new_session=True,
+                )
+                try:
+                    self.wait_until_ready(f'http://{address}/')
+                    latencies, errors, elapsed = self.run(
+                        f'http://{address}{path}', str(token),
+                        options['requests'], options['concurrency'],
+                    )
+                    rss = process_tree_rss(server.pid)
+                finally:
+                    os.killpg(server.pid, signal.SIGTERM)
+                    server.wait()
+
+                if len(latencies) < 2:
+                    raise CommandError(f'{mode}: {errors} of {options["requests"]} requests failed.')
+                quantiles = statistics.quantiles(latencies, n=100)
+                self.stdout.write(
+                    f'{mode}: {len(latencies) / elapsed:.1f} req/s, '
+                    f'p50 {quantiles[49] * 1000:.1f}ms, p99 {quantiles[98] * 1000:.1f}ms, '
+                    f'{errors} errors, rss {rss / 2 ** 20:.0f} MiB'
+                )
+        finally:
+            delete_throwaway_customers(prefix)
+
+    def wait_until_ready(self, url, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                urlopen(url, timeout=1).read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'Server not reachable at {url}.')
+
+    def run(self, url, token, requests, concurrency):
+        def fetch(_):
+            started = time.perf_counter()
+            request = Request(url, headers={'Authorization': f'Bearer {token}'})
+            try:
+                urlopen(request, timeout=60).read()
+            except OSError:
+                return None
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(fetch, range(requests)))
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency for latency in results if latency is not None]
+        return latencies, len(results) - len(latencies), elapsed
@@ -0,0 +1,53 @@
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = ('Boot the WSGI application and the url configuration in a fresh '
+            'interpreter with `-X importtime` and report the slowest modules.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25)
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Fail when the whole boot takes longer.')
+
+    def handle(self, *args, **options):
+        wsgi_module = settings.WSGI_APPLICATION.rsplit('.', 1)[0]
+        script = f'import {wsgi_module}, {settings.ROOT_URLCONF}'
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE),
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+
+        modules = []
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                depth = (len(indent) - 1) // 2
+                modules.append((name, depth, int(self_us), int(cumulative_us)))
+
+        total_ms = sum(cumulative for _, depth, _, cumulative in modules if depth == 0) / 1000
+        column = 2 if options['sort'] == 'self' else 3
+        slowest = sorted(modules, key=lambda module: module[column], reverse=True)
+
+        self.stdout.write(f'{len(modules)} modules imported in {total_ms:.1f}ms')
+        self.stdout.write(f'{"cumulative":>12} {"self":>10}  module')
+        for name, _, self_us, cumulative_us in slowest[:options['top']]:
+            self.stdout.write(f'{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name}')
+
+        if options['budget_ms'] is not None and total_ms > options['budget_ms']:
+            raise CommandError(f'Boot took {total_ms:.1f}ms, over the {options["budget_ms"]}ms budget.')
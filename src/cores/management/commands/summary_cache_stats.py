@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from cores.cache import summary_stats
+
+
+class Command(BaseCommand):
+    help = ('Report hits and misses of the account summary and customer profile '
+            'cache. Counters of a local memory cache are per process, only a '
+            'shared cache reports the numbers of the API workers.')
+
+    def handle(self, *args, **options):
+        stats = summary_stats()
+        lookups = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / lookups if lookups else 0
+
+        self.stdout.write(f"hits: {stats['hits']}, misses: {stats['misses']}, "
+                          f'hit ratio: {ratio:.1%}')
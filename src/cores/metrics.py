@@ -0,0 +1,475 @@
+"""
+Per request timings, sent back as a `Server-Timing` header and aggregated
+into per route histograms served in the Prometheus text format by /metrics.
+
+Every worker process keeps its histograms in memory and writes them to its
+own file of METRICS['DIRECTORY'] every FLUSH_SECONDS, /metrics adds up the
+files of every process, so it reports the whole host whichever worker
+serves it. The counters of exited processes are moved to an archive file,
+their gauges are dropped.
+"""
+import atexit
+import fcntl
+import hmac
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.fields import empty
+
+from .pool import pool_stats
+
+# Phases reported on top of the total, in Server-Timing order.
+PHASES = ['auth', 'db', 'lock', 'serializer', 'render']
+DURATION_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100]
+
+# metrics-<pid>-<token>.json, the token tells apart processes reusing a pid.
+PROCESS_FILE = re.compile(r'^metrics-(\d+)(?:-[0-9a-f]+)?\.json$')
+ARCHIVE_FILE = 'archived.json'
+# Figures of a running pool, meaningless once its process exited.
+POOL_GAUGES = ['size', 'idle', 'in_use', 'max_wait_time']
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class Timings:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.durations = defaultdict(float)
+        self.running = set()
+
+    def server_timing(self, total):
+        entries = [f'db;dur={self.durations["db"] * 1000:.1f};desc="{self.queries} queries"']
+        entries += [
+            f'{phase};dur={self.durations[phase] * 1000:.1f}'
+            for phase in PHASES if phase != 'db' and phase in self.durations
+        ]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to `phase` of the current request."""
+    timings = current_timings.get()
+    # Nested blocks of the same phase are only counted once.
+    if timings is None or phase in timings.running:
+        yield
+        return
+
+    timings.running.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[phase] += time.perf_counter() - started
+        timings.running.discard(phase)
+
+
+@contextmanager
+def recording(timings):
+    """Record the queries of this thread into `timings`, None disables it."""
+    instrument_connections()
+    token = current_timings.set(timings)
+    try:
+        yield
+    finally:
+        current_timings.reset(token)
+
+
+def is_locking(sql):
+    # Row locks are taken by locking reads and by updates, both wait for the
+    # transactions holding the rows.
+    return sql.startswith('UPDATE') or ' FOR UPDATE' in sql
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        timings.queries += 1
+        timings.durations['db'] += elapsed
+        if context['connection'].in_atomic_block and is_locking(sql):
+            timings.durations['lock'] += elapsed
+
+
+def instrument_connections():
+    """Install `record_query` on the connections of the current thread."""
+    for connection in connections.all():
+        if record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(record_query)
+
+
+class TimedSerializerMixin:
+    """Count the validation and representation of a serializer as serializer time."""
+
+    def run_validation(self, data=empty):
+        with timed('serializer'):
+            return super(TimedSerializerMixin, self).run_validation(data)
+
+    def to_representation(self, instance):
+        with timed('serializer'):
+            return super(TimedSerializerMixin, self).to_representation(instance)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        index = next((index for index, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.sum += value
+
+
+class Registry:
+    """Histograms of the requests served by this process, by route."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.last_flush = 0
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.token = uuid.uuid4().hex[:8]
+        self.started = time.time()
+        self.requests = defaultdict(int)
+        self.histograms = {}
+
+    def histogram(self, name, labels, buckets):
+        key = (name, labels)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(buckets)
+        return self.histograms[key]
+
+    def observe(self, route, method, status_code, total, timings):
+        with self.lock:
+            # Never report the requests of the process it was forked from.
+            if self.pid != os.getpid():
+                self.reset()
+            labels = (('route', route), ('method', method))
+            self.requests[labels + (('status', str(status_code)),)] += 1
+            self.histogram('request_duration_seconds', labels, DURATION_BUCKETS).observe(total)
+            self.histogram('request_queries', labels, QUERY_BUCKETS).observe(timings.queries)
+            for phase in PHASES:
+                self.histogram(
+                    'request_phase_seconds', labels + (('phase', phase),), DURATION_BUCKETS,
+                ).observe(timings.durations.get(phase, 0))
+
+            if time.monotonic() - self.last_flush >= settings.METRICS['FLUSH_SECONDS']:
+                self.flush()
+
+    def snapshot(self, pools):
+        return dict(dump(self.requests, self.histograms, pools), started=self.started)
+
+    def flush(self):
+        """Replace the file of this process, called with the lock held."""
+        if self.pid != os.getpid():
+            return
+        pools = pool_stats()
+        if not self.requests and not pools:
+            return
+        self.last_flush = time.monotonic()
+        directory = settings.METRICS['DIRECTORY']
+        os.makedirs(directory, exist_ok=True)
+        write(os.path.join(directory, f'metrics-{self.pid}-{self.token}.json'), self.snapshot(pools))
+
+
+registry = Registry()
+
+
+@atexit.register
+def flush_on_exit():
+    with registry.lock:
+        registry.flush()
+
+
+def dump(requests, histograms, pools):
+    return {
+        'requests': [[list(labels), count] for labels, count in requests.items()],
+        'histograms': [
+            [name, list(labels), histogram.buckets, histogram.counts, histogram.sum]
+            for (name, labels), histogram in histograms.items()
+        ],
+        'pools': pools,
+    }
+
+
+def write(path, snapshot):
+    with open(f'{path}.tmp', 'w') as output:
+        json.dump(snapshot, output)
+    # Readers only ever see complete files.
+    os.replace(f'{path}.tmp', path)
+
+
+def load(path):
+    try:
+        with open(path) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        # Removed or being replaced since listed.
+        return None
+
+
+def add(totals, snapshot, gauges=True):
+    """Add a snapshot to the (requests, histograms, pools) `totals`."""
+    requests, histograms, pools = totals
+    for labels, count in snapshot['requests']:
+        requests[tuple(map(tuple, labels))] += count
+    for metric, labels, buckets, counts, total in snapshot['histograms']:
+        key = (metric, tuple(map(tuple, labels)))
+        if key not in histograms:
+            histograms[key] = Histogram(buckets)
+        histogram = histograms[key]
+        histogram.counts = [left + right for left, right in zip(histogram.counts, counts)]
+        histogram.sum += total
+    for alias, stats in snapshot.get('pools', {}).items():
+        sums = pools.setdefault(alias, defaultdict(int))
+        for name, value in stats.items():
+            if name in POOL_GAUGES and not gauges:
+                continue
+            if name == 'max_wait_time':
+                sums[name] = max(sums[name], value)
+            else:
+                sums[name] += value
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user.
+        return True
+    return True
+
+
+@contextmanager
+def locked(directory):
+    """Serialize the collections of the workers sharing `directory`."""
+    with open(os.path.join(directory, 'collect.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def archive_exited(directory, snapshots):
+    """
+    Move the counters of the processes that exited, or whose pid was reused
+    by a newer process, from their files to the archive and drop their
+    gauges, so totals never go backwards. Returns the archive.
+    """
+    path = os.path.join(directory, ARCHIVE_FILE)
+    archive = load(path) or {'requests': [], 'histograms': [], 'pools': {}, 'merged': []}
+
+    latest = {}
+    for pid, snapshot in snapshots.values():
+        latest[pid] = max(latest.get(pid, 0), snapshot.get('started', 0))
+    exited = [
+        name for name, (pid, snapshot) in snapshots.items()
+        if snapshot.get('started', 0) < latest[pid] or not is_running(pid)
+    ]
+    if not exited:
+        return archive
+
+    totals = (defaultdict(int), {}, {})
+    add(totals, archive)
+    for name in exited:
+        # Already added when removing it failed last time.
+        if name not in archive['merged']:
+            add(totals, snapshots[name][1], gauges=False)
+    archive = dict(dump(*totals), merged=exited)
+    write(path, archive)
+    for name in exited:
+        del snapshots[name]
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+    return archive
+
+
+def collect(directory):
+    """Add up the archive and the files of every running process in `directory`."""
+    totals = (defaultdict(int), {}, {})
+    if not os.path.isdir(directory):
+        return totals
+
+    with locked(directory):
+        snapshots = {}
+        for name in sorted(os.listdir(directory)):
+            match = PROCESS_FILE.match(name)
+            snapshot = load(os.path.join(directory, name)) if match else None
+            if snapshot is not None:
+                snapshots[name] = (int(match.group(1)), snapshot)
+
+        add(totals, archive_exited(directory, snapshots))
+        for _, snapshot in snapshots.values():
+            add(totals, snapshot)
+    return totals
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in pairs
+    )
+    return '{%s}' % ','.join(f'{name}="{value}"' for name, value in escaped)
+
+
+HELP = {
+    'requests_total': 'Requests served, by route, method and status.',
+    'request_duration_seconds': 'Time spent in the middleware stack and the view.',
+    'request_queries': 'Database queries run by a request.',
+    'request_phase_seconds': ('Time of a request spent authenticating, in queries, '
+                              'in row locking statements of transactions, in '
+                              'serializers and rendering.'),
+}
+
+
+# Connection pool figures, `ConnectionPool.stats()` names first.
+POOL_METRICS = [
+    ('waits', 'db_pool_waits_total', 'counter',
+     'Connection checkouts that waited for a free connection.'),
+    ('wait_time', 'db_pool_wait_seconds_total', 'counter',
+     'Time spent waiting for a free connection.'),
+    ('max_wait_time', 'db_pool_max_wait_seconds', 'gauge',
+     'Longest wait for a free connection.'),
+    ('timeouts', 'db_pool_timeouts_total', 'counter',
+     'Checkouts given up after the pool timeout.'),
+    ('created', 'db_pool_created_total', 'counter', 'Connections opened.'),
+    ('discarded', 'db_pool_discarded_total', 'counter',
+     'Connections closed as broken, expired or left in a transaction.'),
+]
+
+
+def render_pool_metrics(prefix, pools):
+    if not pools:
+        return []
+    lines = [
+        f'# HELP {prefix}_db_pool_connections Pooled database connections, idle or in use.',
+        f'# TYPE {prefix}_db_pool_connections gauge',
+    ]
+    for alias, stats in sorted(pools.items()):
+        for state in ['idle', 'in_use']:
+            labels = format_labels([('alias', alias)], state=state)
+            lines.append(f'{prefix}_db_pool_connections{labels} {stats[state]}')
+    for key, name, kind, description in POOL_METRICS:
+        lines += [f'# HELP {prefix}_{name} {description}', f'# TYPE {prefix}_{name} {kind}']
+        for alias, stats in sorted(pools.items()):
+            lines.append(f'{prefix}_{name}{format_labels([("alias", alias)])} {stats[key]}')
+    return lines
+
+
+def render_metrics(requests, histograms, pools=None):
+    prefix = settings.METRICS['PREFIX']
+    lines = [
+        f'# HELP {prefix}_requests_total {HELP["requests_total"]}',
+        f'# TYPE {prefix}_requests_total counter',
+    ]
+    for labels, count in sorted(requests.items()):
+        lines.append(f'{prefix}_requests_total{format_labels(labels)} {count}')
+
+    by_name = defaultdict(list)
+    for (name, labels), histogram in sorted(histograms.items()):
+        by_name[name].append((labels, histogram))
+    for name, series in by_name.items():
+        lines += [f'# HELP {prefix}_{name} {HELP[name]}', f'# TYPE {prefix}_{name} histogram']
+        for labels, histogram in series:
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ['+Inf'], histogram.counts):
+                cumulative += count
+                lines.append(f'{prefix}_{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{prefix}_{name}_sum{format_labels(labels)} {histogram.sum}')
+            lines.append(f'{prefix}_{name}_count{format_labels(labels)} {cumulative}')
+    lines += render_pool_metrics(prefix, pools)
+    return '\n'.join(lines) + '\n'
+
+
+def may_scrape(request):
+    """Whether the request comes from an allowed address or with the metrics token."""
+    if request.META.get('REMOTE_ADDR') in settings.METRICS['ALLOWED_IPS']:
+        return True
+    token = settings.METRICS['TOKEN']
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+
+
+def metrics(request):
+    if not may_scrape(request):
+        return HttpResponseForbidden()
+    with registry.lock:
+        registry.flush()
+    requests, histograms, pools = collect(settings.METRICS['DIRECTORY'])
+    return HttpResponse(
+        render_metrics(requests, histograms, pools),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+class ServerTimingMiddleware(MiddlewareMixin):
+    """
+    Time every request, its queries (row locking statements of transactions
+    apart as lock time), authentication, serializers and rendering.
+    """
+
+    def process_request(self, request):
+        if not settings.METRICS['ENABLED']:
+            return
+        instrument_connections()
+        request.timings = Timings()
+        current_timings.set(request.timings)
+
+    def process_template_response(self, request, response):
+        if getattr(request, 'timings', None) is not None:
+            render = response.render
+
+            def timed_render():
+                with timed('render'):
+                    return render()
+            response.render = timed_render
+        return response
+
+    def process_response(self, request, response):
+        timings = getattr(request, 'timings', None)
+        if timings is None:
+            return response
+        current_timings.set(None)
+
+        total = time.perf_counter() - timings.started
+        registry.observe(route_name(request), request.method, response.status_code, total, timings)
+        if settings.METRICS['SERVER_TIMING']:
+            response['Server-Timing'] = timings.server_timing(total)
+        return response
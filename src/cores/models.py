@@ -1,4 +1,45 @@
 from django.db import models
+from django.dispatch import Signal
+from django.utils import timezone
+
+# Sent by bulk soft deletes and restores with the pks of the rows, no per
+# row save runs.
+soft_deleted = Signal()
+restored = Signal()
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+
+    def update_and_notify(self, signal, **fields):
+        pks = None
+        if signal.has_listeners(self.model):
+            pks = list(self.values_list('pk', flat=True))
+            if not pks:
+                return 0
+            updated = self.model.all_objects.filter(pk__in=pks)
+        else:
+            updated = self
+        count = updated.update(**fields)
+        if pks is not None:
+            signal.send(sender=self.model, pks=pks)
+        return count
+
+    def soft_delete(self):
+        """Flag every row as deleted in a single UPDATE."""
+        now = timezone.now()
+        return self.update_and_notify(soft_deleted, is_deleted=True, deleted_at=now, modified=now)
+
+    def restore(self):
+        return self.update_and_notify(
+            restored, is_deleted=False, deleted_at=None, modified=timezone.now(),
+        )
+
+
+class LiveManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """Rows not soft deleted, `objects` of every CommonInfo model."""
+
+    def get_queryset(self):
+        return super(LiveManager, self).get_queryset().filter(is_deleted=False)
 
 
 class CommonInfo(models.Model):
@@ -7,5 +48,11 @@ class CommonInfo(models.Model):
     deleted_at = models.DateTimeField(null=True, blank=True)
     is_deleted = models.BooleanField(default=False)
 
+    # Deleted rows included, e.g. for the ledger. Declared first, it is the
+    # default manager, so related managers, the admin and the unique
+    # validators of model serializers still see deleted rows.
+    all_objects = SoftDeleteQuerySet.as_manager()
+    objects = LiveManager()
+
     class Meta:
         abstract = True
@@ -11,4 +11,4 @@ class IsCustomer(IsAuthenticated):
 class IsBankOwner(IsCustomer):
 
     def has_object_permission(self, request, view, obj):
-        return obj.holder == request.user.customer
+        return obj.holder_id == request.user.customer.pk
@@ -0,0 +1,206 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Process wide pool of database connections.
+
+    `connect()` opens a new connection, `ping(conn)` raises when an idle
+    connection is no longer usable, `reset(conn)` brings a returned
+    connection back to a clean state and returns False when it must be
+    discarded, `close(conn)` closes it for good.
+    """
+
+    def __init__(self, connect, ping, reset, close, min_size=0, max_size=10,
+                 max_lifetime=None, timeout=5, pre_ping=True):
+        self.connect = connect
+        self.ping = ping
+        self.reset = reset
+        self.close = close
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.opened_at = {}
+        self.size = 0
+        self.pid = os.getpid()
+
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+
+    def expired(self, conn):
+        if self.max_lifetime is None:
+            return False
+        return time.monotonic() - self.opened_at[id(conn)] > self.max_lifetime
+
+    def acquire(self):
+        self.check_fork()
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            with self.condition:
+                while not self.idle and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        logger.warning('No database connection available after %ss '
+                                       '(pool size %s).', self.timeout, self.size)
+                        raise PoolTimeout('Timed out waiting for a database connection.')
+                    waited = True
+                    self.condition.wait(remaining)
+
+                if self.idle:
+                    conn = self.idle.pop()
+                else:
+                    # Reserve the slot, the connection is opened unlocked.
+                    conn = None
+                    self.size += 1
+
+            if waited:
+                self.record_wait(time.monotonic() - started)
+                waited = False
+
+            if conn is None:
+                try:
+                    return self.open()
+                except Exception:
+                    self.forget()
+                    raise
+
+            if self.expired(conn):
+                self.discard(conn)
+                continue
+            if self.pre_ping:
+                try:
+                    self.ping(conn)
+                except Exception:
+                    self.discard(conn)
+                    continue
+            return conn
+
+    def release(self, conn):
+        if os.getpid() != self.pid:
+            return
+        try:
+            usable = self.reset(conn)
+        except Exception:
+            usable = False
+
+        if not usable or self.expired(conn):
+            self.discard(conn)
+            return
+
+        with self.condition:
+            self.idle.append(conn)
+            self.condition.notify()
+
+    def discard(self, conn):
+        """Close a connection checked out of the pool and free its slot."""
+        self.opened_at.pop(id(conn), None)
+        self.discarded += 1
+        try:
+            self.close(conn)
+        except Exception:
+            pass
+        self.forget()
+
+    def forget(self):
+        with self.condition:
+            self.size -= 1
+            self.condition.notify()
+
+    def open(self):
+        conn = self.connect()
+        self.opened_at[id(conn)] = time.monotonic()
+        self.created += 1
+        return conn
+
+    def fill(self):
+        """Open connections up to `min_size`, e.g. when a worker boots."""
+        while True:
+            with self.condition:
+                if self.size >= self.min_size:
+                    return
+                self.size += 1
+            try:
+                conn = self.open()
+            except Exception:
+                self.forget()
+                raise
+            with self.condition:
+                self.idle.append(conn)
+                self.condition.notify()
+
+    def check_fork(self):
+        # Sockets inherited from the parent process are left alone.
+        if os.getpid() != self.pid:
+            with self.condition:
+                self.idle.clear()
+                self.opened_at.clear()
+                self.size = 0
+                self.pid = os.getpid()
+
+    def record_wait(self, elapsed):
+        with self.condition:
+            self.waits += 1
+            self.wait_time += elapsed
+            self.max_wait_time = max(self.max_wait_time, elapsed)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.size - len(self.idle),
+                'created': self.created,
+                'discarded': self.discarded,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+                'max_wait_time': self.max_wait_time,
+                'timeouts': self.timeouts,
+            }
+
+
+# Pools by database alias and process, a forked worker builds its own.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, create):
+    """The pool of `alias` in this process, built by `create()` and filled once."""
+    key = (alias, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = create()
+                pool.fill()
+                _pools[key] = pool
+    return pool
+
+
+def pool_stats():
+    """`ConnectionPool.stats()` of every pool of this process, by alias."""
+    pid = os.getpid()
+    return {alias: pool.stats() for (alias, owner), pool in list(_pools.items()) if owner == pid}
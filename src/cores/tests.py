@@ -0,0 +1,429 @@
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connections
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.reverse import reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from administrations.models import BankInformation
+from administrations.services import post_statement
+from administrations.views import BankInformationViewSet
+from customers.views import CustomerViewSet
+from customers.models import Customer
+from . import benchmarks
+from .asynchronous import async_view
+from .authentication import CustomerTokenObtainPairSerializer
+from .cache import ACCOUNT_SUMMARY, cached_summary, invalidate_summaries
+from .db import PrimaryPinMiddleware, PrimaryReplicaRouter, is_pinned, pin_to_primary, replica_reads
+from .docs import get_views
+from .metrics import registry
+from .pool import ConnectionPool, PoolTimeout, _pools, get_pool
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class PrimaryReplicaRouterTest(TransactionTestCase):
+    # The replica mirrors the test database through its own connection, it
+    # only sees committed rows.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        cache.clear()
+        self.user = User.objects.create_user(username='tester@gmail.com', password='testing')
+        customer = Customer.objects.create(
+            identity_number='123456',
+            address='Jakarta',
+            sex=Customer.MALE,
+            user=self.user,
+        )
+        self.bank_info = BankInformation.objects.create(
+            account_number=BankInformation.generate_account_number(),
+            holder=customer,
+        )
+
+    def test_route_reads_only_when_allowed(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(BankInformation), 'default')
+
+        token = replica_reads.set(True)
+        try:
+            self.assertEqual(router.db_for_read(BankInformation), 'replica')
+            self.assertEqual(router.db_for_write(BankInformation), 'default')
+            self.assertEqual(BankInformation.objects.all().db, 'replica')
+            self.assertEqual(BankInformation.objects.select_for_update().db, 'default')
+        finally:
+            replica_reads.reset(token)
+        self.assertFalse(router.allow_migrate('replica', 'administrations'))
+
+    def test_read_only_action_reads_from_replica(self):
+        url = reverse('v1:administrations:bankinformation-mutations', args=[self.bank_info.guid.hex])
+        view = BankInformationViewSet.as_view(
+            {'get': 'mutations'}, **BankInformationViewSet.mutations.kwargs,
+        )
+
+        request = self.factory.get(path=url)
+        force_authenticate(request, self.user)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            view(request, guid=self.bank_info.guid)
+        self.assertEqual(len(replica), 2)
+        self.assertFalse(replica_reads.get())
+
+        pin_to_primary(self.user.pk)
+        request = self.factory.get(path=url)
+        force_authenticate(request, self.user)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            view(request, guid=self.bank_info.guid)
+        self.assertEqual(len(replica), 0)
+
+    def test_write_request_pins_user(self):
+        middleware = PrimaryPinMiddleware(lambda request: HttpResponse())
+
+        request = self.factory.get('/')
+        request.user = self.user
+        middleware(request)
+        self.assertFalse(is_pinned(self.user.pk))
+
+        request = self.factory.post('/')
+        request.user = self.user
+        middleware(request)
+        self.assertTrue(is_pinned(self.user.pk))
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.alive = True
+        self.in_transaction = False
+
+
+def fake_ping(conn):
+    if not conn.alive:
+        raise ConnectionError('server closed the connection')
+
+
+def fake_reset(conn):
+    conn.in_transaction = False
+    return conn.alive
+
+
+def make_fake_pool(**kwargs):
+    return ConnectionPool(
+        connect=FakeConnection,
+        ping=fake_ping,
+        reset=fake_reset,
+        close=lambda conn: setattr(conn, 'alive', False),
+        **kwargs
+    )
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def make_pool(self, **kwargs):
+        return make_fake_pool(**kwargs)
+
+    def test_reuse_released_connection(self):
+        pool = self.make_pool(min_size=1)
+        pool.fill()
+        conn = pool.acquire()
+        conn.in_transaction = True
+        pool.release(conn)
+
+        self.assertIs(pool.acquire(), conn)
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(pool.stats()['created'], 1)
+
+    def test_replace_dead_and_expired_connections(self):
+        pool = self.make_pool(max_lifetime=60)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.alive = False
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(replacement.alive)
+
+        pool.opened_at[id(replacement)] -= 120
+        pool.release(replacement)
+        self.assertFalse(replacement.alive)
+        self.assertEqual(pool.stats()['discarded'], 2)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_wait_for_a_free_connection(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        conn = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        threading.Timer(0.01, pool.release, [conn]).start()
+        pool.timeout = 5
+        started = time.monotonic()
+        self.assertIs(pool.acquire(), conn)
+        self.assertLess(time.monotonic() - started, 5)
+
+        stats = pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['in_use'], 1)
+
+
+class AsyncViewTest(TransactionTestCase):
+    # Pool threads use their own connection, they only see committed rows.
+
+    def test_serve_read_views_from_the_thread_pool(self):
+        cache.clear()
+        user = User.objects.create_user(username='tester@gmail.com', password='testing')
+        customer = Customer.objects.create(
+            identity_number='123456',
+            address='Jakarta',
+            sex=Customer.MALE,
+            user=user,
+        )
+        BankInformation.objects.create(
+            account_number=BankInformation.generate_account_number(),
+            holder=customer,
+        )
+
+        factory = APIRequestFactory()
+        views = [
+            (BankInformationViewSet.as_view({'get': 'list'}), 'v1:accounts:bankinformation-list'),
+            (CustomerViewSet.as_view({'get': 'list'}), 'v1:customers:customer-list'),
+        ]
+        for view, url_name in views:
+            request = factory.get(reverse(url_name))
+            force_authenticate(request, user)
+            view = async_view(view)
+            self.assertTrue(asyncio.iscoroutinefunction(view))
+
+            response = asyncio.run(view(request))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_rendered)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_stream_export_under_asgi(self):
+        user = User.objects.create_user(username='tester@gmail.com', password='testing')
+        customer = Customer.objects.create(
+            identity_number='123456',
+            address='Jakarta',
+            sex=Customer.MALE,
+            user=user,
+        )
+        bank_info = BankInformation.objects.create(
+            account_number=BankInformation.generate_account_number(),
+            holder=customer,
+            is_active=True,
+        )
+        for amount in range(1, 6):
+            post_statement(bank_info, customer, customer, amount, False, 'Amount deposit')
+        token = CustomerTokenObtainPairSerializer.get_token(user).access_token
+        path = reverse('v1:accounts:bankinformation-export', args=[bank_info.guid.hex])
+
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        # The response is streamed by the event loop of the ASGI handler.
+        asyncio.run(ASGIHandler()({
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'query_string': b'file_format=csv',
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+        }, receive, send))
+
+        self.assertEqual(messages[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in messages[1:]).decode()
+        lines = body.splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual([line.split(',')[2] for line in lines[1:]],
+                         ['1.00', '2.00', '3.00', '4.00', '5.00'])
+
+
+class DocsTest(SimpleTestCase):
+
+    def test_build_docs_on_first_request(self):
+        get_views.cache_clear()
+        for url in ['/docs/', '/docs/schema.js', '/docs/']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_views.cache_info().misses, 1)
+
+
+class SummaryCacheTest(TransactionTestCase):
+
+    def test_payload_built_across_a_write_is_not_cached(self):
+        cache.clear()
+        balance = {'current': 100}
+
+        def build():
+            data = {'balance': balance['current']}
+            # A deposit commits while the payload is being built.
+            balance['current'] = 200
+            invalidate_summaries(ACCOUNT_SUMMARY, [1])
+            return data
+
+        self.assertEqual(cached_summary(ACCOUNT_SUMMARY, 1, build), {'balance': 100})
+        data = cached_summary(ACCOUNT_SUMMARY, 1, lambda: {'balance': balance['current']})
+        self.assertEqual(data, {'balance': 200})
+        self.assertEqual(cached_summary(ACCOUNT_SUMMARY, 1, build), {'balance': 200})
+
+
+class BenchmarkTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_benchmark_every_route(self):
+        self.assertEqual(benchmarks.uncovered_routes(), [])
+        accounts = benchmarks.seed(customers=3, statements=5)
+        results = benchmarks.run(accounts, iterations=3, allocation_samples=1)
+
+        self.assertEqual(set(results), set(benchmarks.routes()))
+        for route, result in results.items():
+            self.assertEqual(result['errors'], 0, route)
+            self.assertGreater(result['queries'], 0, route)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+        route = 'GET administrations:bankinformation-mutations'
+        budget = results[route]['queries']
+        self.assertEqual(benchmarks.check_budgets(results, {route: {'queries': budget}}), [])
+        self.assertEqual(
+            benchmarks.check_budgets(results, {route: {'queries': budget - 1}}),
+            [f'{route}: queries {budget} over the {budget - 1} budget.'],
+        )
+
+
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.settings_override = override_settings(METRICS=dict(
+            settings.METRICS, DIRECTORY=directory, FLUSH_SECONDS=0, TOKEN='scraper',
+        ))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.directory = directory
+
+    def scrape(self):
+        return self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scraper')
+
+    def test_server_timing_and_metrics(self):
+        user = User.objects.create_user(username='tester@gmail.com', password='testing')
+        customer = Customer.objects.create(
+            identity_number='123456',
+            address='Jakarta',
+            sex=Customer.MALE,
+            user=user,
+        )
+        BankInformation.objects.create(
+            account_number=BankInformation.generate_account_number(),
+            holder=customer,
+            is_active=True,
+        )
+        token = CustomerTokenObtainPairSerializer.get_token(user).access_token
+
+        response = self.client.post(
+            reverse('v1:accounts:deposit-list'), {'amount': 100},
+            HTTP_AUTHORIZATION=f'Bearer {token}',
+        )
+        self.assertEqual(response.status_code, 201)
+        timing = dict(
+            entry.split(';', 1) for entry in response['Server-Timing'].split(', ')
+        )
+        self.assertEqual(set(timing), {'db', 'auth', 'lock', 'serializer', 'render', 'total'})
+        # UPDATE and INSERT, in a savepoint of the test transaction.
+        self.assertIn('desc="4 queries"', timing['db'])
+
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        route = 'route="v1:accounts:deposit-list",method="POST"'
+        body = response.content.decode()
+        self.assertIn(f'simplebanking_requests_total{{{route},status="201"}} 1\n', body)
+        self.assertIn(f'simplebanking_request_queries_bucket{{{route},le="5"}} 1\n', body)
+        self.assertIn(f'simplebanking_request_phase_seconds_count{{{route},phase="lock"}} 1\n', body)
+
+        # Another worker process of the host.
+        with open(os.path.join(self.directory, f'metrics-{os.getpid()}-{registry.token}.json')) as source:
+            snapshot = source.read()
+        with open(os.path.join(self.directory, 'metrics-1.json'), 'w') as output:
+            output.write(snapshot)
+        body = self.scrape().content.decode()
+        self.assertIn(f'simplebanking_requests_total{{{route},status="201"}} 2\n', body)
+
+    def test_pool_metrics(self):
+        created = []
+
+        def create():
+            created.append(make_fake_pool(min_size=2))
+            return created[-1]
+
+        pool = get_pool('fake', create)
+        self.addCleanup(_pools.pop, ('fake', os.getpid()))
+        # Built and filled once per process, then looked up.
+        self.assertIs(get_pool('fake', create), pool)
+        self.assertEqual(len(created), 1)
+        pool.acquire()
+
+        body = self.scrape().content.decode()
+        self.assertIn('simplebanking_db_pool_connections{alias="fake",state="idle"} 1\n', body)
+        self.assertIn('simplebanking_db_pool_connections{alias="fake",state="in_use"} 1\n', body)
+        self.assertIn('simplebanking_db_pool_created_total{alias="fake"} 2\n', body)
+        self.assertIn('simplebanking_db_pool_timeouts_total{alias="fake"} 0\n', body)
+
+    def test_metrics_of_exited_processes(self):
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+
+        def write(name, started, count, **pool):
+            with open(os.path.join(self.directory, name), 'w') as output:
+                json.dump({
+                    'requests': [[[['route', 'home'], ['method', 'GET'], ['status', '200']], count]],
+                    'histograms': [],
+                    'pools': {'default': dict(pool, idle=1, in_use=1, created=2)},
+                    'started': started,
+                }, output)
+
+        write(f'metrics-{exited.pid}-a1.json', 1, 3)
+        # Pid 1 was reused, the older file belongs to an exited process.
+        write('metrics-1-b2.json', 1, 2)
+        write('metrics-1-c3.json', 2, 1)
+
+        for _ in range(2):
+            body = self.scrape().content.decode()
+            self.assertIn('simplebanking_requests_total{route="home",method="GET",status="200"} 6\n', body)
+            self.assertIn('simplebanking_db_pool_created_total{alias="default"} 6\n', body)
+            # Only the gauges of the running process are left.
+            self.assertIn('simplebanking_db_pool_connections{alias="default",state="idle"} 1\n', body)
+            self.assertEqual(
+                sorted(name for name in os.listdir(self.directory) if name.endswith('.json')),
+                sorted(['archived.json', 'metrics-1-c3.json', f'metrics-{os.getpid()}-{registry.token}.json']),
+            )
+
+    def test_metrics_refused_by_default(self):
+        self.settings_override.disable()
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.settings_override.enable()
+
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer other').status_code, 403)
+        self.assertEqual(self.scrape().status_code, 200)
+        with self.settings(METRICS=dict(settings.METRICS, TOKEN='', ALLOWED_IPS=['127.0.0.1'])):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
@@ -0,0 +1,205 @@
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+
+from administrations.models import BankInformation
+from customers.models import Customer
+
+REQUIRED_FIELDS = ['email', 'first_name', 'last_name', 'identity_number', 'address', 'sex']
+SECRET_FIELDS = {'password', 'password_hash'}
+# Model fields every input field is stored in, values are checked against
+# their length, format and choices before they reach the database.
+MODEL_FIELDS = {
+    'email': [User._meta.get_field('email'), User._meta.get_field('username')],
+    'first_name': [User._meta.get_field('first_name')],
+    'last_name': [User._meta.get_field('last_name')],
+    'password_hash': [User._meta.get_field('password')],
+    'identity_number': [Customer._meta.get_field('identity_number')],
+    'address': [Customer._meta.get_field('address')],
+    'sex': [Customer._meta.get_field('sex')],
+}
+
+
+def read_rows(stream, file_format):
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = ('Import customers with their user and bank account from a CSV or '
+            'NDJSON file, in chunked bulk inserts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Input file, "-" reads from stdin.')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default=None)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Processes used to hash passwords.')
+        parser.add_argument('--start-at', type=int, default=1,
+                            help='First row to import, to resume a failed run.')
+        parser.add_argument('--rejects', default=None,
+                            help='Write rejected rows to this NDJSON file.')
+
+    def handle(self, *args, **options):
+        file_format = options['format']
+        if file_format is None:
+            file_format = 'ndjson' if options['path'].endswith(('.ndjson', '.jsonl')) else 'csv'
+
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='')
+        rejects = open(options['rejects'], 'a') if options['rejects'] else None
+        self.imported = self.skipped = self.rejected = 0
+        # Duplicates are rejected across the whole input, not only a chunk.
+        self.seen_emails = set()
+        self.seen_identities = set()
+        started = time.perf_counter()
+
+        try:
+            rows = enumerate(read_rows(stream, file_format), start=1)
+            rows = islice(rows, options['start_at'] - 1, None)
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+                while True:
+                    chunk = list(islice(rows, options['chunk_size']))
+                    if not chunk:
+                        break
+
+                    for number, row, errors in self.import_chunk(chunk, pool):
+                        self.rejected += 1
+                        if rejects is not None:
+                            data = {k: v for k, v in row.items() if k not in SECRET_FIELDS}
+                            rejects.write(json.dumps({'row': number, 'errors': errors, 'data': data}) + '\n')
+
+                    elapsed = time.perf_counter() - started
+                    processed = self.imported + self.skipped + self.rejected
+                    self.stdout.write(
+                        f'rows {chunk[0][0]}-{chunk[-1][0]} committed, '
+                        f'{processed / elapsed:.0f} rows/s, '
+                        f'resume with --start-at {chunk[-1][0] + 1}'
+                    )
+        except (OSError, ValueError, DatabaseError) as exc:
+            raise CommandError(exc)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects is not None:
+                rejects.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.imported} imported, {self.skipped} already present, '
+            f'{self.rejected} rejected.'
+        ))
+
+    def import_chunk(self, chunk, pool):
+        """Import one chunk in its own transaction, returns the rejected rows."""
+        rejected = []
+        valid = []
+        for number, row in chunk:
+            errors = self.validate_row(row)
+            email = row.get('email')
+            if email in self.seen_emails or row.get('identity_number') in self.seen_identities:
+                errors['row'] = 'Duplicated within the input.'
+            if errors:
+                rejected.append((number, row, errors))
+                continue
+            self.seen_emails.add(email)
+            self.seen_identities.add(row['identity_number'])
+            valid.append((number, row, email))
+
+        # Rows of a previous, interrupted run are skipped, not duplicated.
+        existing_users = set(User.objects.filter(
+            username__in=[email for _, _, email in valid],
+        ).values_list('username', flat=True))
+        existing_identities = set(Customer.all_objects.filter(
+            identity_number__in=[row['identity_number'] for _, row, _ in valid],
+        ).values_list('identity_number', flat=True))
+
+        pending = []
+        for number, row, email in valid:
+            if email in existing_users:
+                self.skipped += 1
+            elif row['identity_number'] in existing_identities:
+                rejected.append((number, row, {'identity_number': 'Already registered.'}))
+            else:
+                pending.append((row, email))
+
+        raw_passwords = [row['password'] for row, _ in pending if not row.get('password_hash')]
+        hashed = iter(pool.map(make_password, raw_passwords, chunksize=64))
+
+        users = []
+        for row, email in pending:
+            users.append(User(
+                username=email,
+                email=email,
+                first_name=row['first_name'],
+                last_name=row['last_name'],
+                password=row.get('password_hash') or next(hashed),
+            ))
+
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            user_pks = dict(User.objects.filter(
+                username__in=[user.username for user in users],
+            ).values_list('username', 'pk'))
+
+            Customer.objects.bulk_create([
+                Customer(
+                    identity_number=row['identity_number'],
+                    address=row['address'],
+                    sex=row['sex'],
+                    user_id=user_pks[email],
+                )
+                for row, email in pending
+            ])
+            customer_pks = Customer.objects.filter(
+                user_id__in=user_pks.values(),
+            ).values_list('pk', flat=True)
+
+            BankInformation.objects.bulk_create([
+                BankInformation(
+                    account_number=BankInformation.generate_account_number(),
+                    holder_id=customer_pk,
+                )
+                for customer_pk in customer_pks
+            ])
+
+        self.imported += len(pending)
+        return rejected
+
+    def validate_row(self, row):
+        errors = {}
+        for field in REQUIRED_FIELDS:
+            if not row.get(field):
+                errors[field] = 'This field is required.'
+
+        for name, model_fields in MODEL_FIELDS.items():
+            if name in errors or not row.get(name):
+                continue
+            for model_field in model_fields:
+                try:
+                    model_field.clean(row[name], None)
+                except ValidationError as exc:
+                    errors[name] = ' '.join(exc.messages)
+                    break
+
+        if row.get('password_hash'):
+            if 'password_hash' not in errors:
+                try:
+                    identify_hasher(row['password_hash'])
+                except ValueError:
+                    errors['password_hash'] = 'Unknown password hash format.'
+        elif not row.get('password'):
+            errors['password'] = 'Either password or password_hash is required.'
+        return errors
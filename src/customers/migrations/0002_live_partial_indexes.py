@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['user'], name='customer_live_user_idx'),
+        ),
+    ]
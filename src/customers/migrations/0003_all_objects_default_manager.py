@@ -0,0 +1,20 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:19
+
+from django.db import migrations
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_live_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customer',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 16:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_all_objects_default_manager'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='customer_live_user_idx',
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.db import transaction
 from rest_framework import serializers
 
 from administrations.models import BankInformation
+from cores.metrics import TimedSerializerMixin
 from customers.models import Customer
 
 
@@ -30,7 +31,8 @@ class CustomerSignUpSerializer(serializers.Serializer):
         return attrs
 
 
-class CustomerSerializer(CustomerSignUpSerializer,
+class CustomerSerializer(TimedSerializerMixin,
+                         CustomerSignUpSerializer,
                          serializers.ModelSerializer):
     user = SimpleUserSerializer(read_only=True)
 
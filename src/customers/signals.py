@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from cores.authentication import allow_user, deny_user, is_denied
+from cores.cache import ACCOUNT_SUMMARY, CUSTOMER_PROFILE, invalidate_summaries
+from cores.models import restored, soft_deleted
+from .models import Customer
+
+
+def readmit_users(user_ids):
+    """Lift the denial of users active again and holding no deleted customer."""
+    denied = [user_id for user_id in user_ids if is_denied(user_id)]
+    if not denied:
+        return
+    user_ids = User.objects.filter(pk__in=denied, is_active=True).exclude(
+        customer__is_deleted=True,
+    ).values_list('pk', flat=True)
+    for user_id in user_ids:
+        allow_user(user_id)
+
+
+@receiver(post_save, sender=User)
+def deny_inactive_user(sender, instance, created, **kwargs):
+    if created:
+        return
+    if instance.is_active:
+        readmit_users([instance.pk])
+    else:
+        deny_user(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+def deny_deleted_customer(sender, instance, created, **kwargs):
+    if created:
+        return
+    if instance.is_deleted:
+        deny_user(instance.user_id)
+    else:
+        readmit_users([instance.user_id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_summaries(sender, instance, created, **kwargs):
+    if not created:
+        # The holder name is part of the account summary too.
+        customer_ids = Customer.objects.filter(user=instance).values_list('pk', flat=True)
+        invalidate_summaries(CUSTOMER_PROFILE, customer_ids)
+        invalidate_summaries(ACCOUNT_SUMMARY, customer_ids)
+
+
+@receiver(post_save, sender=Customer)
+def invalidate_customer_summaries(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_summaries(CUSTOMER_PROFILE, [instance.pk])
+        invalidate_summaries(ACCOUNT_SUMMARY, [instance.pk])
+
+
+@receiver(soft_deleted, sender=Customer)
+def deny_soft_deleted_customers(sender, pks, **kwargs):
+    user_ids = Customer.all_objects.filter(pk__in=pks).values_list('user_id', flat=True)
+    for user_id in user_ids:
+        deny_user(user_id)
+    invalidate_summaries(CUSTOMER_PROFILE, pks)
+    invalidate_summaries(ACCOUNT_SUMMARY, pks)
+
+
+@receiver(restored, sender=Customer)
+def readmit_restored_customers(sender, pks, **kwargs):
+    readmit_users(Customer.all_objects.filter(pk__in=pks).values_list('user_id', flat=True))
+    invalidate_summaries(CUSTOMER_PROFILE, pks)
+    invalidate_summaries(ACCOUNT_SUMMARY, pks)
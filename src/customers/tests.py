@@ -1,7 +1,20 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
 from rest_framework import status
 from rest_framework.reverse import reverse
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from cores.authentication import ClaimsJWTAuthentication, CustomerTokenObtainPairSerializer, is_denied
+from cores.permissions import IsCustomer
 
 from customers.views import CustomerViewSet
 from .models import Customer
@@ -11,6 +24,7 @@ class CustomerAPITest(APITestCase):
 
     def setUp(self):
         self.factory = APIRequestFactory()
+        cache.clear()
 
     def test_register_customer(self):
         payload = {
@@ -31,6 +45,25 @@ class CustomerAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertFalse(customer.bankinformation.is_active)
 
+    def test_register_with_identity_of_deleted_customer(self):
+        self.test_register_customer()
+        Customer.objects.filter(identity_number='0123456789').soft_delete()
+
+        payload = {
+            'first_name': 'another',
+            'last_name': 'adit',
+            'address': 'JL Dorowati barat 33',
+            'sex': Customer.MALE,
+            'identity_number': '0123456789',
+            'email': 'another@gmail.com',
+            'password': 'testing123',
+        }
+        request = self.factory.post(path=reverse('v1:customers:customer-list'), data=payload)
+        response = CustomerViewSet.as_view({'post': 'create'})(request)
+        # Deleted customers still hold their identity number.
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('identity_number', response.data)
+
     def test_register_customer_with_email_taken(self):
         user = User.objects.create_user(
             username='tester@simplebank.com',
@@ -74,4 +107,106 @@ class CustomerAPITest(APITestCase):
         force_authenticate(request, customer.user)
         view = CustomerViewSet.as_view({'get': 'list'})
         response = view(request)
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_import_customers(self):
+        rows = [
+            {'email': 'first@simplebank.com', 'password': 'testing123'},
+            {'email': 'second@simplebank.com', 'password_hash': make_password('testing123')},
+            # Duplicated in another chunk.
+            {'email': 'first@simplebank.com', 'password': 'testing123'},
+            {'email': 'not-an-email', 'password': 'testing123'},
+            # Longer than the model fields.
+            {'email': 'third@simplebank.com', 'password': 'testing123', 'identity_number': 'I' * 61},
+            {'email': 'fourth@simplebank.com', 'password': 'testing123', 'first_name': 'F' * 151},
+            {'email': 'fifth@simplebank.com', 'password': 'testing123', 'sex': 'other'},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'customers.ndjson')
+            with open(path, 'w') as stream:
+                for index, row in enumerate(rows):
+                    row = dict({
+                        'first_name': 'imported',
+                        'last_name': str(index),
+                        'identity_number': f'ID-{index}',
+                        'address': 'Jakarta',
+                        'sex': Customer.FEMALE,
+                    }, **row)
+                    stream.write(json.dumps(row) + '\n')
+
+            rejects = os.path.join(directory, 'rejects.ndjson')
+            call_command('import_customers', path, '--workers', '1', '--chunk-size', '2',
+                         '--rejects', rejects, stdout=StringIO())
+            # A restarted run must not duplicate anyone.
+            call_command('import_customers', path, '--workers', '1', stdout=StringIO())
+            with open(rejects) as stream:
+                rejected = {
+                    entry['row']: sorted(entry['errors'])
+                    for entry in map(json.loads, stream)
+                }
+
+        self.assertEqual(rejected, {
+            3: ['row'],
+            4: ['email'],
+            5: ['identity_number'],
+            6: ['first_name'],
+            7: ['sex'],
+        })
+        customers = Customer.objects.filter(user__email__endswith='@simplebank.com')
+        self.assertEqual(customers.count(), 2)
+        for customer in customers:
+            self.assertTrue(customer.user.check_password('testing123'))
+            self.assertIsNotNone(customer.bankinformation.account_number)
+
+    def test_token_claims_authenticate_without_queries(self):
+        self.test_register_customer()
+        customer = Customer.objects.get(user__username='adiyatmubarak@gmail.com')
+        bank_info = customer.bankinformation
+
+        view = TokenObtainPairView.as_view(serializer_class=CustomerTokenObtainPairSerializer)
+        request = self.factory.post(
+            path='/token/',
+            data={'username': 'adiyatmubarak@gmail.com', 'password': 'testing123'},
+        )
+        response = view(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        request = self.factory.get(
+            path='/',
+            HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}',
+        )
+        with self.assertNumQueries(0):
+            request.user, _ = ClaimsJWTAuthentication().authenticate(request)
+            self.assertTrue(IsCustomer().has_permission(request, None))
+            self.assertEqual(request.user.customer.pk, customer.pk)
+            self.assertEqual(request.user.bank_id, bank_info.pk)
+
+        customer.user.is_active = False
+        customer.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            ClaimsJWTAuthentication().authenticate(request)
+
+        # Reactivated users are let in again at once.
+        customer.user.is_active = True
+        customer.user.save()
+        user, _ = ClaimsJWTAuthentication().authenticate(request)
+        self.assertEqual(user.customer.pk, customer.pk)
+
+    def test_soft_delete_customers(self):
+        self.test_register_customer()
+        customer = Customer.objects.get(user__username='adiyatmubarak@gmail.com')
+
+        # The pks for the listeners, one UPDATE, the user ids to deny.
+        with self.assertNumQueries(3):
+            deleted = Customer.objects.filter(pk=customer.pk).soft_delete()
+        self.assertEqual(deleted, 1)
+        self.assertFalse(Customer.objects.filter(pk=customer.pk).exists())
+
+        customer = Customer.all_objects.get(pk=customer.pk)
+        self.assertTrue(customer.is_deleted)
+        self.assertIsNotNone(customer.deleted_at)
+        self.assertTrue(is_denied(customer.user_id))
+
+        Customer.all_objects.filter(pk=customer.pk).restore()
+        self.assertTrue(Customer.objects.filter(pk=customer.pk).exists())
+        self.assertFalse(is_denied(customer.user_id))
@@ -1,4 +1,6 @@
 from rest_framework import routers
+
+from cores.asynchronous import async_read_urls
 from . import views
 
 app_name = 'customers'
@@ -6,4 +8,4 @@ app_name = 'customers'
 router = routers.SimpleRouter()
 router.register('', views.CustomerViewSet)
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = async_read_urls(router.urls, ['customer-list'])
\ No newline at end of file
@@ -2,17 +2,21 @@ from rest_framework import mixins, viewsets
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
+from cores.cache import CUSTOMER_PROFILE, cached_summary
+from cores.db import ReplicaReadMixin
 from cores.permissions import IsCustomer
 from .models import Customer
 from .serializers import CustomerSerializer
 
 
-class CustomerViewSet(mixins.CreateModelMixin,
+class CustomerViewSet(ReplicaReadMixin,
+                      mixins.CreateModelMixin,
                       mixins.ListModelMixin,
                       viewsets.GenericViewSet):
-    queryset = Customer.objects.filter(is_deleted=False).order_by('-created')
+    queryset = Customer.objects.order_by('-created')
     serializer_class = CustomerSerializer
     permission_classes = [IsCustomer]
+    replica_actions = {'list'}
 
     def get_permissions(self):
         if self.action == 'create':
@@ -20,7 +24,12 @@ class CustomerViewSet(mixins.CreateModelMixin,
         return super(CustomerViewSet, self).get_permissions()
 
     def list(self, request, *args, **kwargs):
-        customer = request.user.customer
-        serializer = self.get_serializer(instance=customer)
+        customer_pk = request.user.customer.pk
 
-        return Response(serializer.data)
+        def build():
+            customer = self.get_queryset().select_related('user').get(pk=customer_pk)
+            return self.get_serializer(instance=customer).data
+
+        data = cached_summary(CUSTOMER_PROFILE, customer_pk, build)
+
+        return Response(data)
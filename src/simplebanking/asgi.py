@@ -0,0 +1,18 @@
+"""
+ASGI config for simplebanking project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+serve it with e.g. ``uvicorn simplebanking.asgi:application --workers 4``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'simplebanking.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
+
+application = get_asgi_application()
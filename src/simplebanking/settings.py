@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
 import os
+import tempfile
+from datetime import timedelta
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import sys
@@ -53,6 +55,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'cores.metrics.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,6 +63,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'cores.db.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'simplebanking.urls'
@@ -82,6 +86,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'simplebanking.wsgi.application'
 
+# Set by `simplebanking.asgi`: read endpoints are served by async views, their
+# blocking ORM work runs in a pool of ASYNC_READ_WORKERS threads per process.
+# Keep it within the database connections available to a process.
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS') == '1'
+ASYNC_READ_WORKERS = 10
+
 
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
@@ -94,10 +104,44 @@ DATABASES = {
         'PASSWORD': 'testing',
         'HOST': 'bank_db',
         'PORT': '5432',
-        'CONN_MAX_AGE ': 60
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Pooled connections: every worker process keeps between MIN_SIZE and
+# MAX_SIZE connections, checked with a `SELECT 1` before use when PRE_PING is
+# set and replaced after MAX_LIFETIME seconds. A request waits up to TIMEOUT
+# seconds for a free connection.
+DATABASE_POOL = {
+    'ENABLED': False,
+    'MIN_SIZE': 1,
+    'MAX_SIZE': 10,
+    'MAX_LIFETIME': 1800,
+    'TIMEOUT': 5,
+    'PRE_PING': True,
+}
+
+if DATABASE_POOL['ENABLED']:
+    DATABASES['default'].update({
+        'ENGINE': 'cores.backends.postgresql_pool',
+        # Connections go back to the pool at the end of every request.
+        'CONN_MAX_AGE': 0,
+        'POOL': DATABASE_POOL,
+    })
+
+# Read only endpoints can be served by streaming replicas, add them to
+# DATABASES and list their aliases here, e.g.
+#
+#     DATABASES['replica'] = {..., 'TEST': {'MIRROR': 'default'}}
+#     REPLICA_DATABASES = ['replica']
+REPLICA_DATABASES = []
+
+# A user who wrote keeps reading from the primary for this many seconds, longer
+# than the replication lag, so a new balance is never hidden by a replica.
+REPLICA_STICKY_SECONDS = 5
+
+DATABASE_ROUTERS = ['cores.db.PrimaryReplicaRouter']
+
 if 'test' in sys.argv:
     PASSWORD_HASHERS = [
         'django.contrib.auth.hashers.MD5PasswordHasher',
@@ -107,7 +151,12 @@ if 'test' in sys.argv:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-        }
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            'TEST': {'MIRROR': 'default'},
+        },
     }
 
 
@@ -151,14 +200,87 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, "static/")
 
 
+# --------------------------- Cache config -------------------------------------
+# Local memory is only shared by the threads of a process, it is enough for a
+# single worker process. Point the default cache to a shared backend
+# (memcached, redis) when running several worker processes or nodes, else the
+# summaries cached by a worker outlive the writes served by the others and
+# the token denylist only applies to the worker that wrote it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+# ------------------------------------------------------------------------------
+
+
 # --------------------------- DRF config ---------------------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'cores.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'PAGE_SIZE': 100
 }
 # ------------------------------------------------------------------------------
+
+
+# --------------------------- Banking config -----------------------------------
+# Replayed responses of `Idempotency-Key` requests are kept for this long,
+# see `manage.py purge_idempotency_keys`.
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Cached account summaries and customer profiles are dropped on every write,
+# the timeout only bounds entries of writes done outside the API.
+SUMMARY_CACHE_TTL = 300
+
+# Partition the statements table by month (PostgreSQL 11+, ignored elsewhere).
+# Applied by the `0009_partition_bankstatement` migration, or later on with
+# `manage.py create_statement_partitions --convert`. Schedule the command to
+# keep STATEMENT_PARTITIONS_AHEAD monthly partitions created in advance.
+PARTITION_STATEMENTS = False
+STATEMENT_PARTITIONS_AHEAD = 3
+
+# Rows fetched per round trip by statement exports.
+EXPORT_CHUNK_SIZE = 2000
+
+# Account numbers reserved at once by every worker process.
+ACCOUNT_NUMBER_BLOCK_SIZE = 100
+
+# Group commit: deposits of concurrent requests in a worker process are
+# written together, one transaction per batch. A batch is flushed after
+# WINDOW_MS or as soon as it reaches MAX_BATCH_SIZE deposits.
+GROUP_COMMIT = {
+    'ENABLED': False,
+    'WINDOW_MS': 5,
+    'MAX_BATCH_SIZE': 100,
+    # Longest wait of a request for its batch, a 503 is returned after it.
+    'TIMEOUT_SECONDS': 5,
+}
+
+# Request timings: a Server-Timing header on every response (SERVER_TIMING)
+# and per route histograms served by /metrics. Every worker process writes
+# its histograms to DIRECTORY every FLUSH_SECONDS, use a directory local to
+# the host and empty it when deploying.
+#
+# /metrics is refused unless the client address is in ALLOWED_IPS (the
+# address the server sees, e.g. the proxy's) or the request carries
+# `Authorization: Bearer <TOKEN>`; both are empty by default.
+METRICS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    'DIRECTORY': os.environ.get(
+        'METRICS_DIRECTORY', os.path.join(tempfile.gettempdir(), 'simplebanking-metrics'),
+    ),
+    'FLUSH_SECONDS': 5,
+    'PREFIX': 'simplebanking',
+    'ALLOWED_IPS': [],
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),
+}
+
+if 'test' in sys.argv:
+    # Test requests never show up on the /metrics of a local server.
+    METRICS['DIRECTORY'] = os.path.join(tempfile.gettempdir(), 'simplebanking-test-metrics')
+# ------------------------------------------------------------------------------
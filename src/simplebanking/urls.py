@@ -15,12 +15,15 @@ Including another URLconf
 """
 from datetime import datetime
 
+from django.conf import settings
 from django.contrib import admin
 from django.http import JsonResponse, HttpRequest
 from django.urls import path, include
-from rest_framework.documentation import include_docs_urls
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from cores.authentication import CustomerTokenObtainPairSerializer
+from cores.metrics import metrics
+
 
 def home(request: HttpRequest) -> JsonResponse:
     return JsonResponse({
@@ -30,11 +33,20 @@ def home(request: HttpRequest) -> JsonResponse:
     })
 
 
+async def async_home(request: HttpRequest) -> JsonResponse:
+    return home(request)
+
+
 urlpatterns = [
-    path('', home),
+    path('', async_home if settings.ASYNC_READ_VIEWS else home),
     path('api/v1/', include('api.urls.urls_v1', namespace='v1')),
     path('admin/', admin.site.urls),
-    path('docs/', include_docs_urls(title='Simple Bank API')),
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('docs/', include('cores.docs', namespace='api-docs')),
+    path(
+        'token/',
+        TokenObtainPairView.as_view(serializer_class=CustomerTokenObtainPairSerializer),
+        name='token_obtain_pair',
+    ),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metrics, name='metrics'),
 ]